@@ -0,0 +1,91 @@
+import asyncio
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    List,
+    Optional,
+    Set,
+    TypeVar,
+)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class AsyncBatcher(Generic[K, V]):
+    """
+    Coalesce loads issued close together into a single batch call.
+
+    Modeled on DataLoader: callers `await batcher.load(key)`, and every key
+    requested within `delay` seconds (or until `max_batch_size` keys are
+    waiting) is handed to `batch_fn` in one call. `batch_fn` returns a dict
+    mapping each key to its value; keys missing from the dict resolve to None.
+
+    Example:
+        async def load_users(ids):
+            rows = await fetch_users_where_id_in(ids)
+            return {row["id"]: row for row in rows}
+
+        user_batcher = AsyncBatcher(load_users)
+        user = await user_batcher.load(user_id)
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[K]], Awaitable[Dict[K, V]]],
+        max_batch_size: int = 100,
+        delay: float = 0.01,
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.delay = delay
+        self.pending: Dict[K, asyncio.Future] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._dispatches: Set[asyncio.Task] = set()
+
+    async def load(self, key: K) -> Optional[V]:
+        """Queue `key` for the next batch and wait for its value."""
+        future = self.pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self.pending[key] = future
+
+            if len(self.pending) >= self.max_batch_size:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.delay, self._flush)
+
+        # Shield so one cancelled caller doesn't cancel the shared result
+        return await asyncio.shield(future)
+
+    def _flush(self) -> None:
+        """Send everything pending as one batch."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self.pending = self.pending, {}
+        if not batch:
+            return
+
+        task = asyncio.ensure_future(self._dispatch(batch))
+        self._dispatches.add(task)
+        task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: Dict[K, asyncio.Future]) -> None:
+        """Run `batch_fn` and resolve each caller's future."""
+        try:
+            results = await self.batch_fn(list(batch))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(results.get(key))
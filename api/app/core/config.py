@@ -1,7 +1,8 @@
 # api/app/core/config.py
-from typing import List
+from functools import lru_cache
+from typing import Tuple
 
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
@@ -14,6 +15,18 @@ class Settings(BaseSettings):
     SUPABASE_URL: str
     SUPABASE_ANON_KEY: str
     SUPABASE_SERVICE_ROLE_KEY: str
+    # Project JWT secret; when set, Storage URLs are signed locally
+    SUPABASE_JWT_SECRET: str | None = None
+    # Hand out public, long-cached image URLs instead of signed ones. Only
+    # enable once the 'receipts' bucket is public.
+    RECEIPT_IMAGES_PUBLIC: bool = False
+    # Supavisor transaction-mode pooler (port 6543) for direct Postgres access.
+    # Table/RPC calls go through PostgREST over HTTPS and don't use it.
+    SUPAVISOR_URL: str | None = None
+
+    # Redis (optional) for caches shared across workers
+    REDIS_URL: str | None = None
+    MEMBERSHIP_CACHE_TTL: int = 300
 
     # OCR & AI (optional for now)
     VERYFI_URL: str | None = None
@@ -23,24 +36,43 @@ class Settings(BaseSettings):
     VERYFI_API_KEY: str | None = None
     OPENAI_API_KEY: str | None = None
 
+    # Worker threads for blocking Supabase SDK calls (I/O-bound, not CPU-bound)
+    SUPABASE_IO_THREADS: int = 64
+
+    # Background OCR jobs allowed to run at once per worker; the rest wait
+    OCR_MAX_CONCURRENCY: int = 16
+    # Veryfi calls allowed in flight per worker; match the plan's concurrency limit
+    VERYFI_MAX_CONCURRENCY: int = 10
+    # Receipts still "processing" after this many seconds are marked failed;
+    # their background job was lost (e.g. the worker restarted)
+    RECEIPT_PROCESSING_TIMEOUT: int = 900
+
     # Rate limiting
     RATE_LIMIT_RECEIPTS_PER_DAY: int = 10
 
     # CORS
-    CORS_ORIGINS: List[str] = [
+    CORS_ORIGINS: Tuple[str, ...] = (
         "http://localhost:8081",  # Expo local
         "exp://localhost:8081",
-    ]
+    )
 
     # Environment
     ENVIRONMENT: str = "development"
     DEBUG: bool = True
 
-    class Config:
-        env_file = ".env"
-        case_sensitive = True
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        case_sensitive=True,
         # Allow extra fields without error
-        extra = "ignore"
+        extra="ignore",
+        frozen=True,
+    )
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Load settings once; later calls reuse the parsed environment."""
+    return Settings()
 
 
-settings = Settings()
+settings = get_settings()
@@ -0,0 +1,32 @@
+from functools import lru_cache
+from typing import Optional
+
+from redis.asyncio import Redis
+
+from app.core.config import settings
+
+
+@lru_cache(maxsize=1)
+def get_redis() -> Optional[Redis]:
+    """
+    Return the shared Redis client, or None when REDIS_URL isn't configured.
+
+    Redis is optional: callers treat None (and any Redis error) as a cache
+    miss and fall back to the database.
+    """
+    if not settings.REDIS_URL:
+        return None
+    return Redis.from_url(
+        settings.REDIS_URL,
+        decode_responses=True,
+        socket_timeout=0.5,
+        socket_connect_timeout=0.5,
+    )
+
+
+async def close_redis() -> None:
+    """Close the Redis connection pool, if one was created."""
+    if get_redis.cache_info().currsize:
+        client = get_redis()
+        if client is not None:
+            await client.aclose()
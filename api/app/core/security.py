@@ -1,15 +1,67 @@
 import asyncio
-from typing import Any, Dict
+import hashlib
+import time
+from typing import Any, Dict, Tuple
 
+import jwt
+from cachetools import TLRUCache
 from fastapi import HTTPException, status
+from supabase import AuthApiError, AuthError
 
-from app.core.supabase import supabase
+from app.core.asyncio_helpers import to_thread_fast
+from app.core.config import settings
+from app.core.supabase import get_supabase
+
+SUPABASE_AUTH_URL = f"{settings.SUPABASE_URL}/auth/v1"
+
+# Asymmetric signing keys published by Supabase Auth. The key set is fetched
+# once and cached in memory, so verification normally needs no network call.
+jwks_client = jwt.PyJWKClient(
+    f"{SUPABASE_AUTH_URL}/.well-known/jwks.json",
+    cache_keys=True,
+    lifespan=900,
+    headers={"apikey": settings.SUPABASE_ANON_KEY},
+)
+
+# Verified tokens are cached for a short time so repeat requests skip the
+# Supabase Auth round-trip. An entry never outlives the token's `exp` claim.
+TOKEN_CACHE_TTL = 30
+
+
+def _token_ttu(_key: str, value: Tuple[Dict[str, Any], float], now: float) -> float:
+    """Expire after TOKEN_CACHE_TTL or at the token's `exp`, whichever is first."""
+    _user_data, expires_at = value
+    return min(now + TOKEN_CACHE_TTL, expires_at)
+
+
+_token_cache: TLRUCache = TLRUCache(maxsize=10000, ttu=_token_ttu, timer=time.time)
+
+# In-flight verifications, so concurrent requests with the same token share
+# a single verification.
+_pending_verifications: Dict[str, asyncio.Future] = {}
+
+
+def _token_cache_key(token: str) -> str:
+    """Hash the token so raw credentials are never kept in memory as keys."""
+    return hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
+def _token_expiry(token: str) -> float:
+    """Read the `exp` claim without verifying; 0 if it can't be decoded."""
+    try:
+        claims = jwt.decode(token, options={"verify_signature": False})
+    except jwt.PyJWTError:
+        return 0.0
+    return float(claims.get("exp") or 0)
 
 
 async def verify_supabase_token(token: str) -> Dict[str, Any]:
     """
     Verify JWT token issued by Supabase Auth.
 
+    Results are cached briefly per token, and concurrent verifications of
+    the same token are coalesced into a single verification.
+
     Args:
         token: JWT access token from Supabase
 
@@ -19,40 +71,120 @@ async def verify_supabase_token(token: str) -> Dict[str, Any]:
     Raises:
         HTTPException: If token is invalid or expired
     """
+    key = _token_cache_key(token)
+
+    cached = _token_cache.get(key)
+    if cached is not None:
+        return cached[0]
+
+    pending = _pending_verifications.get(key)
+    if pending is None:
+        pending = asyncio.ensure_future(_verify_and_cache(token, key))
+        _pending_verifications[key] = pending
+        pending.add_done_callback(lambda _: _pending_verifications.pop(key, None))
+
+    # Shield so one cancelled request doesn't cancel the shared verification
+    return await asyncio.shield(pending)
+
+
+async def _verify_and_cache(token: str, key: str) -> Dict[str, Any]:
+    """Verify the token and cache the resulting user data."""
+    user_data = await _verify_token(token)
+
+    expires_at = _token_expiry(token)
+    if expires_at > time.time():
+        _token_cache[key] = (user_data, expires_at)
+
+    return user_data
+
+
+def _decode_token(token: str) -> Dict[str, Any]:
+    """Check the token signature against the JWKS and return its claims."""
+    signing_key = jwks_client.get_signing_key_from_jwt(token)
+    return jwt.decode(
+        token,
+        signing_key.key,
+        algorithms=["RS256", "ES256"],
+        audience="authenticated",
+        issuer=SUPABASE_AUTH_URL,
+    )
+
+
+async def _verify_token(token: str) -> Dict[str, Any]:
+    """
+    Verify the token locally against Supabase's published signing keys.
+
+    Projects still signing with the legacy HS256 shared secret publish no
+    usable keys, so those tokens are verified by Supabase Auth instead.
+    """
+    try:
+        if jwt.get_unverified_header(token).get("alg") == "HS256":
+            return await _fetch_supabase_user(token)
+
+        # Signature checks are CPU-bound and a cold JWKS fetch blocks,
+        # so keep both off the event loop.
+        payload = await to_thread_fast(_decode_token, token)
+
+    except jwt.PyJWKClientError:
+        return await _fetch_supabase_user(token)
+    except jwt.InvalidTokenError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token is invalid or expired",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    return {
+        "id": payload["sub"],
+        "email": payload.get("email"),
+        "user_metadata": payload.get("user_metadata"),
+        "created_at": None,  # not carried in the access token
+    }
+
+
+async def _fetch_supabase_user(token: str) -> Dict[str, Any]:
+    """Ask Supabase Auth for the user behind the token."""
     try:
         # The Supabase Python client is synchronous. Run the call in a thread
         # so this function can remain async and callers can `await` it.
-        response = await asyncio.to_thread(lambda: supabase.auth.get_user(token))
+        response = await to_thread_fast(get_supabase().auth.get_user, token)
 
-        # `response` is an APIResponse; if no user, treat as unauthorized
-        user = getattr(response, "user", None)
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-
-        # Return user data
-        return {
-            "id": user.id,
-            "email": user.email,
-            "user_metadata": getattr(user, "user_metadata", None),
-            "created_at": getattr(user, "created_at").isoformat(),
-        }
-
-    except Exception as e:
-        # Handle various auth errors
-        if "invalid" in str(e).lower() or "expired" in str(e).lower():
+    except AuthApiError as e:
+        # Supabase rejected the token itself
+        if e.status in (401, 403):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Token is invalid or expired",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        raise _credentials_error()
+
+    except AuthError:
+        # Malformed token, missing session, ...
+        raise _credentials_error()
 
-        # Generic error
+    # `response` is an APIResponse; if no user, treat as unauthorized
+    user = getattr(response, "user", None)
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
+            detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    # Return user data
+    return {
+        "id": user.id,
+        "email": user.email,
+        "user_metadata": getattr(user, "user_metadata", None),
+        "created_at": getattr(user, "created_at").isoformat(),
+    }
+
+
+def _credentials_error() -> HTTPException:
+    """Generic 401 for tokens we couldn't validate."""
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
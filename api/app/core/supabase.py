@@ -1,29 +1,57 @@
-from typing import Optional
+from functools import lru_cache
 
+import httpx
 from fastapi import Request
-from supabase import Client, create_client
+from postgrest import AsyncPostgrestClient
+from supabase import (
+    AsyncClient,
+    AsyncClientOptions,
+    Client,
+    ClientOptions,
+    create_client,
+)
 
 from app.core.config import settings
 
+# One pooled HTTP client shared by every Supabase client in the process, so
+# requests reuse keep-alive connections instead of paying a TCP+TLS handshake.
+http_client = httpx.Client(
+    timeout=60.0,
+    limits=httpx.Limits(
+        max_keepalive_connections=20, max_connections=100, keepalive_expiry=30.0
+    ),
+)
 
-def get_supabase_client(access_token: Optional[str] = None) -> Client:
+# Async counterpart for queries awaited directly on the event loop, so they
+# don't tie up an I/O thread. Sized for request concurrency, not thread count.
+# HTTP/2 lets concurrent uploads and queries share one TLS connection to the
+# Supabase host instead of each opening its own.
+async_http_client = httpx.AsyncClient(
+    http2=True,
+    timeout=60.0,
+    limits=httpx.Limits(
+        max_keepalive_connections=50, max_connections=200, keepalive_expiry=30.0
+    ),
+)
+
+
+@lru_cache(maxsize=1)
+def get_supabase() -> Client:
     """
-    Create and return a Supabase client instance.
+    Return the shared Supabase client, creating it on first use.
     Uses anon key (respects RLS policies).
     """
-    client = create_client(
-        supabase_url=settings.SUPABASE_URL, supabase_key=settings.SUPABASE_ANON_KEY
+    return create_client(
+        supabase_url=settings.SUPABASE_URL,
+        supabase_key=settings.SUPABASE_ANON_KEY,
+        options=ClientOptions(httpx_client=http_client),
     )
 
-    if access_token:
-        client.auth.set_session(access_token, "")
-
-    return client
-
 
-def get_supabase_admin_client() -> Client:
+@lru_cache(maxsize=1)
+def get_supabase_admin() -> Client:
     """
-    Create and return a Supabase admin client instance.
+    Return the shared Supabase admin client, creating it on first use.
     Uses service role key to bypass RLS (for backend operations).
     """
     if not settings.SUPABASE_SERVICE_ROLE_KEY:
@@ -31,19 +59,60 @@ def get_supabase_admin_client() -> Client:
     return create_client(
         supabase_url=settings.SUPABASE_URL,
         supabase_key=settings.SUPABASE_SERVICE_ROLE_KEY,
+        options=ClientOptions(httpx_client=http_client),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_async_supabase() -> AsyncClient:
+    """
+    Return the shared async Supabase client, creating it on first use.
+    Uses anon key (respects RLS policies).
+    """
+    return AsyncClient(
+        supabase_url=settings.SUPABASE_URL,
+        supabase_key=settings.SUPABASE_ANON_KEY,
+        options=AsyncClientOptions(httpx_client=async_http_client),
     )
 
 
-supabase_admin: Client = get_supabase_admin_client()  # Service role (bypasses RLS)
+@lru_cache(maxsize=1)
+def get_async_supabase_admin() -> AsyncClient:
+    """
+    Return the shared async Supabase admin client, creating it on first use.
+    Uses service role key to bypass RLS (for backend operations).
+    """
+    if not settings.SUPABASE_SERVICE_ROLE_KEY:
+        raise ValueError("SUPABASE_SERVICE_ROLE_KEY not found in settings")
+    return AsyncClient(
+        supabase_url=settings.SUPABASE_URL,
+        supabase_key=settings.SUPABASE_SERVICE_ROLE_KEY,
+        options=AsyncClientOptions(httpx_client=async_http_client),
+    )
 
 
-def get_authenticated_supabase(request: Request) -> Client:
+def get_authenticated_async_supabase(request: Request) -> AsyncPostgrestClient:
     """
-    Get a supabase client authenticated with the user's JWT token from the request.
+    Get a PostgREST client authenticated with the user's JWT token from the request.
+
+    The client is a thin per-request wrapper over the shared connection pool,
+    so RLS applies to the caller without building a new Supabase client.
     """
-    auth_header = request.headers.get("Authorization", "")
-    token = auth_header.replace("Bearer ", "") if auth_header else None
-    return get_supabase_client(access_token=token)
+    auth_header = request.headers.get("Authorization")
+    token = (
+        auth_header[7:] if auth_header and auth_header.startswith("Bearer ") else None
+    )
+    return AsyncPostgrestClient(
+        f"{settings.SUPABASE_URL}/rest/v1",
+        headers={
+            "apikey": settings.SUPABASE_ANON_KEY,
+            "Authorization": f"Bearer {token or settings.SUPABASE_ANON_KEY}",
+        },
+        http_client=async_http_client,
+    )
 
 
-supabase: Client = get_supabase_client()  # Anon key (respects RLS)
+async def close_supabase_clients() -> None:
+    """Close the pooled HTTP connections on shutdown."""
+    await async_http_client.aclose()
+    http_client.close()
@@ -28,7 +28,8 @@ async def get_current_user(
             detail="Invalid authentication credentials",
         )
 
-    return User(**user_data)
+    # The data comes from a token we just verified, so skip re-validation
+    return User.model_construct(**user_data)
 
 
 async def get_current_user_id(current_user: User = Depends(get_current_user)) -> str:
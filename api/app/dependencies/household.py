@@ -1,108 +1,161 @@
-import asyncio
-from typing import Optional
+import logging
+from typing import Dict, Final, List, Optional, Tuple
 
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException, Request, status
+from redis.exceptions import RedisError
 
-from app.core.supabase import supabase_admin
+from app.core.batching import AsyncBatcher
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.core.supabase import get_async_supabase_admin
 from app.dependencies.auth import get_current_user
 from app.models.auth import User
+from app.services.households import get_or_create_primary_household
 
+logger = logging.getLogger(__name__)
+
+
+async def _select_households_for_users(user_ids: List[str]):
+    return await (
+        get_async_supabase_admin()
+        .table("user_household_roles")
+        .select("*")
+        .in_("user_id", user_ids)
+        .execute()
+    )
+
+
+async def _load_user_households(user_ids: List[str]) -> Dict[str, list]:
+    """Fetch households with roles for many users in one query, grouped by user."""
+    result = await _select_households_for_users(user_ids)
+
+    households = {user_id: [] for user_id in user_ids}
+    for row in result.data:
+        households[row.pop("user_id")].append(row)
+    return households
+
+
+# Concurrent requests for different users share one household_members query
+household_batcher = AsyncBatcher(_load_user_households, max_batch_size=100, delay=0.01)
+
+
+# Higher level = more privileges; unknown roles rank below "member"
+_ROLE_LEVEL: Final = {"owner": 3, "admin": 2, "member": 1}
+
+# "household_id:user_id" -> role. Membership rarely changes, so most
+# household-scoped requests can skip the household_members query.
+#
+# With Redis configured, roles are cached only there: one copy shared by every
+# worker, so invalidating it revokes access everywhere at once. Without Redis
+# this in-process cache is used instead; invalidation then only reaches the
+# calling worker, and other workers may keep a removed member's old role for
+# up to its 60s TTL.
+_membership_cache: TTLCache = TTLCache(maxsize=50000, ttl=60)
+
+
+def _membership_key(household_id: str, user_id: str) -> str:
+    return f"{household_id}:{user_id}"
+
+
+def _redis_membership_key(household_id: str, user_id: str) -> str:
+    return f"hm:{user_id}:{household_id}"
+
+
+async def _get_cached_role(household_id: str, user_id: str) -> Optional[str]:
+    """Look up a cached role in Redis, or locally when Redis isn't configured."""
+    redis = get_redis()
+    if redis is None:
+        return _membership_cache.get(_membership_key(household_id, user_id))
 
-async def get_user_households(current_user: User = Depends(get_current_user)) -> list:
-    """
-    Get all households that the current user belongs to.
-    """
     try:
-        result = await asyncio.to_thread(
-            lambda: (
-                supabase_admin.table("household_members")
-                .select("household_id, role, households(*)")
-                .eq("user_id", current_user.id)
-                .execute()
-            )
-        )
+        return await redis.get(_redis_membership_key(household_id, user_id))
+    except RedisError as e:
+        logger.warning(f"Redis membership lookup failed: {str(e)}")
+        return None
 
-        return result.data
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to fetch households: {str(e)}",
+
+async def _cache_role(household_id: str, user_id: str, role: str) -> None:
+    """Remember a role in Redis, or locally when Redis isn't configured."""
+    redis = get_redis()
+    if redis is None:
+        _membership_cache[_membership_key(household_id, user_id)] = role
+        return
+
+    try:
+        await redis.set(
+            _redis_membership_key(household_id, user_id),
+            role,
+            ex=settings.MEMBERSHIP_CACHE_TTL,
         )
+    except RedisError as e:
+        logger.warning(f"Redis membership write failed: {str(e)}")
 
 
-async def get_user_primary_household(
-    current_user: User = Depends(get_current_user),
-) -> str:
+async def invalidate_household_membership(household_id: str, user_id: str) -> None:
+    """Drop a cached role after a membership is added, changed or removed."""
+    _membership_cache.pop(_membership_key(household_id, user_id), None)
+
+    redis = get_redis()
+    if redis is None:
+        return
+
+    try:
+        await redis.delete(_redis_membership_key(household_id, user_id))
+    except RedisError as e:
+        logger.warning(f"Redis membership invalidation failed: {str(e)}")
+
+
+async def _select_member_roles(household_ids: List[str], user_ids: List[str]):
+    return await (
+        get_async_supabase_admin()
+        .table("household_members")
+        .select("household_id, user_id, role")
+        .in_("household_id", household_ids)
+        .in_("user_id", user_ids)
+        .execute()
+    )
+
+
+async def _load_member_roles(
+    keys: List[Tuple[str, str]],
+) -> Dict[Tuple[str, str], str]:
     """
-    Get the user's primary (first) household ID.
-    Creates one if the user has no households using the DB RPC.
+    Fetch roles for many (household_id, user_id) pairs in one query.
+
+    PostgREST can't filter on a tuple IN, so this selects the cross product of
+    the requested households and users; pairs that weren't asked for are
+    ignored when the batcher resolves each key.
     """
-    try:
-        # Check if user has any households
-        result = await asyncio.to_thread(
-            lambda: (
-                supabase_admin.table("household_members")
-                .select("household_id")
-                .eq("user_id", current_user.id)
-                .limit(1)
-                .execute()
-            )
-        )
+    household_ids = list({household_id for household_id, _ in keys})
+    user_ids = list({user_id for _, user_id in keys})
+    result = await _select_member_roles(household_ids, user_ids)
 
-        if result.data and len(result.data) > 0:
-            hid = result.data[0]["household_id"]
-            return hid
-
-        # Create a default household using the RPC
-
-        rpc_result = await asyncio.to_thread(
-            lambda: supabase_admin.rpc(
-                "create_household_with_member",
-                {
-                    "payload": {
-                        "user_id": current_user.id,
-                        "email": current_user.email,
-                        "name": f"{current_user.email}'s Household",
-                    }
-                },
-            ).execute()
-        )
+    return {(row["household_id"], row["user_id"]): row["role"] for row in result.data}
 
-        if hasattr(rpc_result, "error") and rpc_result.error:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Failed to create household: {rpc_result.error}",
-            )
 
-        # Extract household id from RPC response
-        rpc_data = getattr(rpc_result, "data", None) or (
-            rpc_result.get("data") if isinstance(rpc_result, dict) else None
-        )
-        if not rpc_data:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to create household: no data returned",
-            )
+# Concurrent access checks (e.g. a burst of receipt requests) share one
+# household_members query instead of issuing one each
+member_role_batcher = AsyncBatcher(_load_member_roles, max_batch_size=100, delay=0.005)
 
-        # Normalize: RPC returns a household row (dict or object)
-        if isinstance(rpc_data, dict):
-            household_id = rpc_data.get("id")
-        else:
-            household_id = getattr(rpc_data, "id", None)
 
-        if not household_id:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to extract household id from RPC response",
-            )
+async def get_user_households(current_user: User = Depends(get_current_user)) -> list:
+    """
+    Get all households that the current user belongs to, each with their role.
+    """
+    return await household_batcher.load(current_user.id)
 
-        return household_id
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to get/create household: {str(e)}",
-        )
+async def get_user_primary_household(
+    current_user: User = Depends(get_current_user),
+) -> str:
+    """
+    Get the user's primary (first) household ID.
+    Creates one if the user has no households; the lookup and the create
+    happen in a single DB RPC.
+    """
+    household = await get_or_create_primary_household(current_user)
+    return household["id"]
 
 
 async def get_current_household(
@@ -139,40 +192,27 @@ async def verify_household_access(
     Raises:
         HTTPException: If user doesn't have access or required role
     """
-    try:
-        result = await asyncio.to_thread(
-            lambda: (
-                supabase_admin.table("household_members")
-                .select("role")
-                .eq("household_id", household_id)
-                .eq("user_id", current_user.id)
-                .execute()
-            )
-        )
-        if not result.data or len(result.data) == 0:
+    user_role = await _get_cached_role(household_id, current_user.id)
+
+    if user_role is None:
+        user_role = await member_role_batcher.load((household_id, current_user.id))
+        if user_role is None:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You don't have access to this household",
             )
 
-        user_role = result.data[0]["role"]
-
-        # Check role requirement if specified
-        if required_role:
-            role_hierarchy = {"owner": 3, "admin": 2, "member": 1}
-            if role_hierarchy.get(user_role, 0) < role_hierarchy.get(required_role, 0):
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail=f"You need {required_role} role to perform this action",
-                )
+        await _cache_role(household_id, current_user.id, user_role)
 
-        return {"household_id": household_id, "role": user_role}
+    # Check role requirement if specified
+    if required_role:
+        if _ROLE_LEVEL.get(user_role, 0) < _ROLE_LEVEL.get(required_role, 0):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"You need {required_role} role to perform this action",
+            )
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to verify household access: {str(e)}",
-        )
+    return {"household_id": household_id, "role": user_role}
 
 
 # TODO: Maybe this is extra?
@@ -197,3 +237,20 @@ async def verify_header_household_access(
     Verify access to the household specified in the header.
     """
     return await verify_household_access(household_id, current_user)
+
+
+async def get_current_user_with_household(
+    household_id: str = Depends(get_household_header),
+    current_user: User = Depends(get_current_user),
+) -> dict:
+    """
+    Resolve the caller and their access to the header household in one step.
+
+    Token verification is local and the role comes from the membership
+    cache, so on the hot path this needs no round trip at all.
+
+    Returns:
+        dict with the user, household_id and user's role
+    """
+    access = await verify_household_access(household_id, current_user)
+    return {**access, "user": current_user}
@@ -0,0 +1,156 @@
+import os
+import tempfile
+import threading
+from typing import BinaryIO, Optional
+
+from fastapi import File, HTTPException, UploadFile, status
+
+from app.core.asyncio_helpers import to_thread_fast
+
+# Allowed image MIME types, mapped to the extension used for the stored file.
+# The extension comes from the validated type, never the client's filename.
+MIME_TO_EXT = {
+    "image/jpeg": "jpeg",
+    "image/jpg": "jpeg",
+    "image/png": "png",
+    "image/webp": "webp",
+}
+
+# (offset, bytes) signatures each stored type must carry in its first 12
+# bytes, so content that doesn't match its declared type is turned away
+_MAGIC = {
+    "jpeg": ((0, b"\xff\xd8\xff"),),
+    "png": ((0, b"\x89PNG\r\n\x1a\n"),),
+    "webp": ((0, b"RIFF"), (8, b"WEBP")),
+}
+
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Joined once for the validation error message
+_ALLOWED_TYPES_STR = ", ".join(sorted(MIME_TO_EXT))
+
+
+async def validated_image(file: UploadFile = File(...)) -> UploadFile:
+    """
+    Reject uploads that aren't a supported image type, or are too large.
+
+    The declared type is checked against the file's leading bytes, and the
+    size against MAX_UPLOAD_SIZE when the client sent it.
+
+    Runs as a dependency, so bad requests fail before the route handler runs.
+
+    @router.post("/upload")
+    async def upload(file: UploadFile = Depends(validated_image)):
+        ext = MIME_TO_EXT[file.content_type]
+    """
+    if file.content_type not in MIME_TO_EXT:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid file type. Allowed types: {_ALLOWED_TYPES_STR}",
+        )
+
+    if file.size is not None and file.size > MAX_UPLOAD_SIZE:
+        raise _too_large(MAX_UPLOAD_SIZE)
+
+    await file.seek(0)
+    header = await file.read(12)
+    await file.seek(0)
+    if not _has_magic(MIME_TO_EXT[file.content_type], header):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File content doesn't match its type ({file.content_type})",
+        )
+    return file
+
+
+def _has_magic(ext: str, header: bytes) -> bool:
+    return all(
+        header[offset : offset + len(magic)] == magic for offset, magic in _MAGIC[ext]
+    )
+
+
+def _too_large(max_size: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+        detail=f"File size exceeds {max_size // (1024 * 1024)}MB limit",
+    )
+
+
+# One reusable copy buffer per worker thread, so spooling an upload doesn't
+# allocate a fresh bytes object for every chunk
+_copy_buffers = threading.local()
+
+
+def _copy_buffer() -> memoryview:
+    view = getattr(_copy_buffers, "view", None)
+    if view is None:
+        view = _copy_buffers.view = memoryview(bytearray(UPLOAD_CHUNK_SIZE))
+    return view
+
+
+def _readinto(src: BinaryIO):
+    """
+    `src.readinto`, or an equivalent built on read() for files without it.
+
+    SpooledTemporaryFile (UploadFile.file) only gained readinto in Python 3.11.
+    """
+    readinto = getattr(src, "readinto", None)
+    if readinto is not None:
+        return readinto
+
+    def read_into(buffer: memoryview) -> int:
+        data = src.read(len(buffer))
+        n = len(data)
+        buffer[:n] = data
+        return n
+
+    return read_into
+
+
+def _copy_limited(src: BinaryIO, max_size: int, hasher=None) -> Optional[str]:
+    """Copy `src` to a temp file chunk by chunk; None (and no file) if too big."""
+    buffer = _copy_buffer()
+    readinto = _readinto(src)
+    total = 0
+    with tempfile.NamedTemporaryFile(prefix="receipt-", delete=False) as dst:
+        try:
+            while n := readinto(buffer):
+                total += n
+                if total > max_size:
+                    break
+                chunk = buffer[:n]
+                if hasher is not None:
+                    hasher.update(chunk)
+                dst.write(chunk)
+            else:
+                return dst.name
+        except BaseException:
+            os.unlink(dst.name)
+            raise
+    os.unlink(dst.name)
+    return None
+
+
+async def spool_upload_limited(file: UploadFile, max_size: int, hasher=None) -> str:
+    """
+    Copy an upload to a temporary file, stopping as soon as it exceeds `max_size`.
+
+    The image is streamed through in 64KB chunks, so it is never held in memory
+    as one buffer; pass a hashlib object as `hasher` to hash it on the way.
+
+    Returns:
+        Path of the temporary file; the caller must delete it
+
+    Raises:
+        HTTPException: If the file is larger than `max_size`
+    """
+    # Starlette knows the size once the body is spooled; reject without reading
+    if file.size is not None and file.size > max_size:
+        raise _too_large(max_size)
+
+    await file.seek(0)
+    path = await to_thread_fast(_copy_limited, file.file, max_size, hasher)
+    if path is None:
+        raise _too_large(max_size)
+    return path
@@ -1,16 +1,65 @@
 # api/app/main.py
-from fastapi import FastAPI
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager, suppress
+
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 
+from app.core.asyncio_helpers import io_executor
 from app.core.config import settings
+from app.core.redis import close_redis
+from app.core.supabase import close_supabase_clients
 from app.routers.auth import router as auth_router
 from app.routers.households import router as household_router
 from app.routers.receipts import router as receipts_router
+from app.services.ocr_service import ocr_service
+from app.services.storage_service import warm_storage_connection
+
+logger = logging.getLogger(__name__)
+
+# Liveness responses never change while the process runs, so encode them once
+# instead of on every probe.
+_ROOT_BODY = json.dumps({"message": "FreshReceipt API is running"}).encode()
+_HEALTH_BODY = json.dumps(
+    {"status": "healthy", "environment": settings.ENVIRONMENT}
+).encode()
+
+
+async def _sweep_stale_receipts() -> None:
+    """Periodically fail receipts whose background job was lost."""
+    while True:
+        await ocr_service.fail_stale_receipts(settings.RECEIPT_PROCESSING_TIMEOUT)
+        await asyncio.sleep(settings.RECEIPT_PROCESSING_TIMEOUT / 3)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Send any remaining asyncio.to_thread calls to the same sized I/O pool
+    asyncio.get_running_loop().set_default_executor(io_executor)
+    # Best effort: a slow or failed warm-up only costs the first request
+    try:
+        await asyncio.wait_for(warm_storage_connection(), timeout=5)
+    except Exception as e:
+        logger.warning(f"Storage warm-up failed: {e!r}")
+    sweeper = asyncio.create_task(_sweep_stale_receipts())
+    yield
+    # Let an in-flight sweep unwind before its clients are closed
+    sweeper.cancel()
+    with suppress(asyncio.CancelledError):
+        await sweeper
+    await close_redis()
+    await close_supabase_clients()
+    await ocr_service.aclose()
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
     description="Receipt scanning and food inventory management",
+    lifespan=lifespan,
 )
 
 # CORS middleware
@@ -20,9 +69,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Receipt list pagination cursor; browsers hide it from JS otherwise
+    expose_headers=["X-Next-Cursor"],
 )
 
 
+@app.exception_handler(Exception)
+async def unhandled_exception_handler(request: Request, exc: Exception):
+    """
+    Turn any unhandled error into a 500 response.
+
+    Dependencies and routes only raise HTTPException for expected failures
+    (401/403/404...); everything else ends up here instead of being wrapped
+    in try/except at every call site.
+    """
+    logger.exception(f"Unhandled error on {request.method} {request.url.path}")
+    return JSONResponse(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        content={"detail": "Internal server error"},
+    )
+
+
 # routers
 app.include_router(auth_router, prefix=settings.API_V1_PREFIX)
 app.include_router(household_router, prefix=settings.API_V1_PREFIX)
@@ -31,12 +98,12 @@ app.include_router(receipts_router, prefix=settings.API_V1_PREFIX)
 
 @app.get("/")
 async def root():
-    return {"message": "FreshReceipt API is running"}
+    return Response(content=_ROOT_BODY, media_type="application/json")
 
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "environment": settings.ENVIRONMENT}
+    return Response(content=_HEALTH_BODY, media_type="application/json")
 
 
 @app.get("/debug/routes")
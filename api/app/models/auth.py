@@ -23,6 +23,14 @@ class UserResponse(BaseModel):
     created_at: Optional[str] = None
 
 
+class TokenVerifyResponse(BaseModel):
+    """Response model for token verification"""
+
+    valid: bool
+    user_id: str
+    email: str
+
+
 class TokenPayload(BaseModel):
     """JWT token payload"""
 
@@ -35,6 +35,7 @@ class HouseholdMember(BaseModel):
     user_id: str
     role: str
     joined_at: Optional[str] = None
+    email: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -51,3 +52,10 @@ class InviteMemberRequest(BaseModel):
 
     email: str
     role: str = "member"
+
+
+class InviteMemberResponse(BaseModel):
+    """Response after inviting a member to a household"""
+
+    message: str
+    member: HouseholdMember
@@ -50,7 +50,7 @@ class ReceiptUploadResponse(BaseModel):
     """Response model for receipt upload"""
 
     id: str
-    image_url: str
+    image_url: Optional[str] = None
     household_id: str
     purchase_date: datetime
     ocr_status: Optional[str] = None
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends
 
 from app.dependencies.auth import get_current_user
-from app.models.auth import User, UserResponse
+from app.models.auth import TokenVerifyResponse, User, UserResponse
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
@@ -19,7 +19,7 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
     )
 
 
-@router.get("/verify")
+@router.get("/verify", response_model=TokenVerifyResponse)
 async def verify_token(current_user: User = Depends(get_current_user)):
     """
     Checks if provided token is valid
@@ -1,12 +1,17 @@
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
+from postgrest import AsyncPostgrestClient
 
-from app.core.supabase import supabase, supabase_admin
+from app.core.supabase import (
+    get_async_supabase_admin,
+    get_authenticated_async_supabase,
+)
 from app.dependencies.auth import get_current_user
 from app.dependencies.household import (
+    get_current_user_with_household,
     get_user_households,
-    verify_header_household_access,
+    invalidate_household_membership,
     verify_household_access,
 )
 from app.models.auth import User
@@ -16,29 +21,61 @@ from app.models.household import (
     HouseholdMember,
     HouseholdWithRole,
     InviteMemberRequest,
+    InviteMemberResponse,
 )
-from app.services.households import (
-    get_or_create_primary_household,
-    get_primary_household_id,
-)
+from app.services.households import get_or_create_primary_household
 
 router = APIRouter(prefix="/households", tags=["Households"])
 
 
+async def _select_household_with_role(
+    client: AsyncPostgrestClient, household_id: str, user_id: str
+):
+    return await (
+        client.table("households")
+        .select("*, household_members!inner(role)")
+        .eq("id", household_id)
+        .eq("household_members.user_id", user_id)
+        .maybe_single()
+        .execute()
+    )
+
+
+async def _select_members_with_email(household_id: str):
+    return await (
+        get_async_supabase_admin()
+        .table("household_members_with_email")
+        .select("*")
+        .eq("household_id", household_id)
+        .execute()
+    )
+
+
+async def _invite_member_atomic(household_id: str, email: str, role: str):
+    return await (
+        get_async_supabase_admin()
+        .rpc(
+            "invite_member_atomic",
+            {"p_household_id": household_id, "p_email": email, "p_role": role},
+        )
+        .execute()
+    )
+
+
+async def _remove_member(client: AsyncPostgrestClient, household_id: str, user_id: str):
+    return await client.rpc(
+        "remove_member", {"p_household_id": household_id, "p_user_id": user_id}
+    ).execute()
+
+
 @router.get("", response_model=List[HouseholdWithRole])
 async def list_user_households(current_user: User = Depends(get_current_user)):
     """
     Get all households that the current user is a member of.
     """
     try:
-        result = get_user_households(current_user)
-
-        households = []
-        for item in result.data:
-            household_data = item["households"]
-            households.append({**household_data, "role": item["role"]})
-
-        return households
+        # Rows come from the user_household_roles view, already flat
+        return await get_user_households(current_user)
 
     except Exception as e:
         raise HTTPException(
@@ -50,17 +87,14 @@ async def list_user_households(current_user: User = Depends(get_current_user)):
 @router.get("/food-items", response_model=List[FoodItem])
 async def list_food_items(
     request: Request,
-    current_user: User = Depends(get_current_user),
-    access: dict = Depends(verify_header_household_access),
+    access: dict = Depends(get_current_user_with_household),
 ):
     try:
-        from app.core.supabase import get_authenticated_supabase
-
-        auth_supabase = get_authenticated_supabase(request)
+        auth_supabase = get_authenticated_async_supabase(request)
         household_id = access["household_id"]
 
         # get household items
-        result = (
+        result = await (
             auth_supabase.table("food_items")
             .select("*")
             .eq("household_id", household_id)
@@ -117,21 +151,29 @@ async def create_household(
 
 @router.get("/{household_id}", response_model=HouseholdWithRole)
 async def get_household(
-    access: dict = Depends(verify_household_access),
+    household_id: str,
+    request: Request,
     current_user: User = Depends(get_current_user),
 ):
     """
     Get details of a specific household.
+
+    Runs under the caller's JWT, so RLS only returns households they belong
+    to; the embedded membership row supplies their role in the same query.
     """
     try:
-        result = get_primary_household_id(current_user)
+        result = await _select_household_with_role(
+            get_authenticated_async_supabase(request), household_id, current_user.id
+        )
 
-        if not result.data:
+        if result is None or not result.data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Household not found"
             )
 
-        return {**result.data[0], "role": access["role"]}
+        household = result.data
+        membership = household.pop("household_members")[0]
+        return {**household, "role": membership["role"]}
 
     except HTTPException:
         raise
@@ -145,23 +187,15 @@ async def get_household(
 @router.get("/{household_id}/members", response_model=List[HouseholdMember])
 async def list_household_members(
     household_id: str,
-    request: Request,
     _access: dict = Depends(verify_household_access),
 ):
     """
     Get all members of a household.
     """
     try:
-        from app.core.supabase import get_authenticated_supabase
-
-        auth_supabase = get_authenticated_supabase(request)
-
-        result = (
-            auth_supabase.table("household_members")
-            .select("*")
-            .eq("household_id", household_id)
-            .execute()
-        )
+        # The view joins auth.users for each member's email, so it is only
+        # readable with the service role; access was checked above.
+        result = await _select_members_with_email(household_id)
 
         return result.data
 
@@ -172,7 +206,11 @@ async def list_household_members(
         )
 
 
-@router.post("/{household_id}/members", status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/{household_id}/members",
+    response_model=InviteMemberResponse,
+    status_code=status.HTTP_201_CREATED,
+)
 async def invite_member(
     household_id: str,
     invite_data: InviteMemberRequest,
@@ -188,53 +226,30 @@ async def invite_member(
     )
 
     try:
-        # Find user by email
-        # Note: This requires service role key to access auth.users
-        user_result = supabase_admin.auth.admin.list_users()
-        target_user = None
-
-        for user in user_result:
-            if user.email == invite_data.email:
-                target_user = user
-                break
+        # Email lookup, duplicate check and insert happen in one transaction
+        result = await _invite_member_atomic(
+            household_id, invite_data.email, invite_data.role
+        )
+        outcome = result.data
 
-        if not target_user:
+        if outcome["status"] == "not_found":
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"User with email {invite_data.email} not found",
             )
 
-        # Check if already a member
-        existing = (
-            supabase.table("household_members")
-            .select("id")
-            .eq("household_id", household_id)
-            .eq("user_id", target_user.id)
-            .execute()
-        )
-
-        if existing.data:
+        if outcome["status"] == "already_member":
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="User is already a member of this household",
             )
 
-        # Add member
-        result = (
-            supabase.table("household_members")
-            .insert(
-                {
-                    "household_id": household_id,
-                    "user_id": target_user.id,
-                    "role": invite_data.role,
-                }
-            )
-            .execute()
-        )
+        member = outcome["member"]
+        await invalidate_household_membership(household_id, member["user_id"])
 
         return {
             "message": f"Successfully invited {invite_data.email}",
-            "member": result.data[0],
+            "member": member,
         }
 
     except HTTPException:
@@ -250,37 +265,35 @@ async def invite_member(
     "/{household_id}/members/{user_id}", status_code=status.HTTP_204_NO_CONTENT
 )
 async def remove_member(
-    household_id: str, user_id: str, current_user: User = Depends(get_current_user)
+    household_id: str,
+    user_id: str,
+    request: Request,
+    current_user: User = Depends(get_current_user),
 ):
     """
     Remove a member from the household.
     Requires admin or owner role, or user can remove themselves.
     """
-    # Allow user to remove themselves, or require admin role
-    if user_id != current_user.id:
-        await verify_household_access(
-            household_id=household_id, current_user=current_user, required_role="admin"
-        )
-    else:
-        # Still need to verify they're in the household
-        await verify_household_access(
-            household_id=household_id, current_user=current_user
-        )
-
     try:
-        result = (
-            supabase.table("household_members")
-            .delete()
-            .eq("household_id", household_id)
-            .eq("user_id", user_id)
-            .execute()
+        # The RPC runs as the caller, checks their role and deletes in one call
+        result = await _remove_member(
+            get_authenticated_async_supabase(request), household_id, user_id
         )
+        outcome = result.data
+
+        if outcome["status"] == "forbidden":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You need admin role to perform this action",
+            )
 
-        if not result.data:
+        if outcome["status"] == "not_found":
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Member not found"
             )
 
+        await invalidate_household_membership(household_id, user_id)
+
         return None
 
     except HTTPException:
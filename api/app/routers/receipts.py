@@ -1,111 +1,252 @@
 import asyncio
-from datetime import datetime, timezone
-from typing import List
-
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+import base64
+import contextlib
+import hashlib
+import logging
+import os
+import re
+import uuid
+from typing import List, Optional, Tuple
+
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    status,
+)
+from postgrest import AsyncPostgrestClient
 
-from app.core.supabase import supabase
+from app.core.config import settings
+from app.core.supabase import (
+    get_async_supabase_admin,
+    get_authenticated_async_supabase,
+)
 from app.dependencies.auth import get_current_user
-from app.dependencies.household import get_current_household, verify_household_access
+from app.dependencies.household import get_current_household
+from app.dependencies.upload import (
+    MAX_UPLOAD_SIZE,
+    MIME_TO_EXT,
+    spool_upload_limited,
+    validated_image,
+)
 from app.models.auth import User
 from app.models.receipt import Receipt, ReceiptUploadResponse
-from app.services.storage_service import upload_receipt_image
+from app.services.helpers import utcnow_iso
+from app.services.ocr_service import ocr_service
+from app.services.storage_service import (
+    get_receipt_image_url,
+    get_receipt_image_urls,
+    new_receipt_image_path,
+    receipt_image_path,
+    upload_receipt_image,
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/receipts", tags=["Receipts"])
 
-# Allowed image MIME types
-ALLOWED_IMAGE_TYPES = {
-    "image/jpeg",
-    "image/jpg",
-    "image/png",
-    "image/webp",
-}
+# Columns returned by the receipt list; the detail endpoint returns the rest
+RECEIPT_LIST_COLUMNS = (
+    "id, household_id, purchase_date, store_name, total_amount, "
+    "image_url, ocr_status, created_at"
+)
+MAX_RECEIPTS_PAGE_SIZE = 100
+
+# created_at as PostgREST returns it. Matched rather than parsed: Postgres
+# trims trailing zeros from fractional seconds, which fromisoformat rejects
+# before Python 3.11. It also keeps quotes out of the cursor filter.
+_CURSOR_TIMESTAMP = re.compile(
+    r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(\.\d{1,6})?(Z|[+-]\d{2}(:?\d{2})?)?"
+)
+
+
+def _encode_receipt_cursor(created_at: str, receipt_id: str) -> str:
+    """Opaque keyset cursor for the row a page ended on."""
+    return base64.urlsafe_b64encode(f"{created_at}|{receipt_id}".encode()).decode()
+
+
+def _decode_receipt_cursor(cursor: str) -> Tuple[str, str]:
+    """Split a cursor back into (created_at, id)."""
+    try:
+        created_at, receipt_id = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        )
+        if not _CURSOR_TIMESTAMP.fullmatch(created_at):
+            raise ValueError(created_at)
+        uuid.UUID(receipt_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+    return created_at, receipt_id
+
+
+async def _select_receipt(client: AsyncPostgrestClient, receipt_id: str):
+    return await (
+        client.table("receipts")
+        .select("*")
+        .eq("id", receipt_id)
+        .maybe_single()
+        .execute()
+    )
+
+
+async def _with_image_urls(receipts: List[dict]) -> List[dict]:
+    """
+    Swap the receipts' stored image paths for URLs the client can load.
 
-# Allowed file extensions
-ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png", "webp"}
+    Rows keep the durable storage path; URLs are minted per read, at most one
+    Storage request per page. When Storage does the signing, images it can't
+    sign come back as null (see get_receipt_image_urls).
+    """
+    paths = [
+        receipt_image_path(r["image_url"]) if r.get("image_url") else None
+        for r in receipts
+    ]
+    urls = await get_receipt_image_urls([path for path in paths if path])
+    for receipt, path in zip(receipts, paths):
+        if path:
+            receipt["image_url"] = urls.get(path)
+    return receipts
+
+
+async def _get_accessible_receipt(request: Request, receipt_id: str) -> dict:
+    """
+    Fetch a receipt as the calling user.
 
+    The select runs under the caller's JWT, so the receipts RLS policy only
+    returns the row to members of its household. One query covers both the
+    lookup and the access check; receipts the user can't see are reported as
+    not found rather than confirming they exist.
+    """
+    result = await _select_receipt(
+        get_authenticated_async_supabase(request), receipt_id
+    )
 
-def get_file_extension(filename: str) -> str:
-    """Extract file extension from filename."""
-    if "." not in filename:
+    if result is None or not result.data:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="File must have an extension",
+            status_code=status.HTTP_404_NOT_FOUND, detail="Receipt not found"
+        )
+
+    return result.data
+
+
+def _new_image_hasher():
+    """Content hash used as the receipt_ocr_cache key."""
+    return hashlib.blake2b(digest_size=16)
+
+
+# Caps in-flight OCR jobs so an upload burst can't flood Veryfi or the DB
+_ocr_slots = asyncio.Semaphore(settings.OCR_MAX_CONCURRENCY)
+
+
+async def _run_receipt_ocr(**kwargs) -> None:
+    """Background OCR job. Failures are logged and stored on the receipt."""
+    async with _ocr_slots:
+        try:
+            await ocr_service.process_receipt_from_url(**kwargs)
+        except Exception:
+            # process_receipt_from_url has already marked the receipt "failed"
+            pass
+
+
+async def _run_receipt_upload(
+    image_path: str,
+    file_path: str,
+    file_extension: str,
+    image_hash: str,
+    receipt_id: str,
+    user_id: str,
+) -> None:
+    """
+    Background job for a new upload: store the image, then OCR it.
+
+    The receipt row already exists (ocr_status "processing"); if the image
+    can't be stored it is marked "failed" instead.
+    """
+    try:
+        await upload_receipt_image(
+            image_path,
+            file_path,
+            file_extension,
+            public=settings.RECEIPT_IMAGES_PUBLIC,
+        )
+        image_url = await get_receipt_image_url(image_path)
+    except Exception as e:
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        logger.error(f"Image upload failed for receipt {receipt_id}: {detail}")
+        await ocr_service.update_receipt_status(
+            receipt_id, "failed", error_message=f"Image upload failed: {detail}"
         )
-    return filename.rsplit(".", 1)[1].lower()
+        return
+    finally:
+        _remove_spooled_file(file_path)
+
+    await _run_receipt_ocr(
+        image_url=image_url,
+        receipt_id=receipt_id,
+        user_id=user_id,
+        image_hash=image_hash,
+    )
+
+
+def _remove_spooled_file(file_path: str) -> None:
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(file_path)
 
 
 @router.post(
     "/upload", response_model=ReceiptUploadResponse, status_code=status.HTTP_201_CREATED
 )
 async def upload_receipt(
-    file: UploadFile = File(...),
+    background_tasks: BackgroundTasks,
+    file: UploadFile = Depends(validated_image),
     current_user: User = Depends(get_current_user),
     household: str = Depends(get_current_household),
 ):
     """
     Upload a receipt image and create a receipt record.
 
+    The image is stored and OCR'd after the response is sent; the receipt is
+    returned with ocr_status "processing" and a null image_url, since the
+    image isn't stored yet. Poll `GET /receipts/{receipt_id}` for the result.
+
     Requires:
     - Valid JWT token
     - User must be a member of the household
     - Image file (JPEG, PNG, or WebP)
     """
+    file_path = None
     try:
-        # Validate file type
-        if file.content_type not in ALLOWED_IMAGE_TYPES:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid file type. Allowed types: {', '.join(ALLOWED_IMAGE_TYPES)}",
-            )
-
-        # Get file extension
-        file_extension = get_file_extension(file.filename)
-
-        if file_extension not in ALLOWED_EXTENSIONS:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid file extension. Allowed: {', '.join(ALLOWED_EXTENSIONS)}",
-            )
-
-        # Read file content
-        file_content = await file.read()
+        # Content type was validated by the dependency
+        file_extension = MIME_TO_EXT[file.content_type]
 
-        # Validate file size (max 10MB)
-        max_size = 10 * 1024 * 1024  # 10MB
-        if len(file_content) > max_size:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="File size exceeds 10MB limit",
-            )
-
-        # Upload image to Supabase Storage
-        image_url = await upload_receipt_image(
-            file_content=file_content,
-            file_extension=file_extension,
-            current_user=current_user,
-            household_id=household,
-        )
-
-        from app.core.supabase import supabase_admin
+        # Stream to a temp file, rejecting oversize uploads early; the hash
+        # (for reusing earlier OCR of identical images) is taken on the way
+        hasher = _new_image_hasher()
+        file_path = await spool_upload_limited(file, MAX_UPLOAD_SIZE, hasher)
 
-        # Create receipt record in database
-        purchase_date = (
-            datetime.now(timezone.utc)
-            .isoformat(timespec="microseconds")
-            .replace("+00:00", "Z")
-        )
+        # The path is fixed up front so the row can be created before the
+        # bytes reach Storage
+        image_path = new_receipt_image_path(current_user, household, file_extension)
 
+        # Create receipt record in database; purchase_date defaults to now()
         receipt_data = {
             "household_id": household,
-            "purchase_date": purchase_date,
-            "image_url": image_url,
+            "image_url": image_path,
             "uploaded_by": current_user.id,
-            "ocr_status": "pending",
+            "ocr_status": "processing",
+            # Starts the clock for the stale-receipt sweep
+            "updated_at": utcnow_iso(),
         }
 
-        result = await asyncio.to_thread(
-            lambda: supabase_admin.table("receipts").insert(receipt_data).execute()
+        result = await (
+            get_async_supabase_admin().table("receipts").insert(receipt_data).execute()
         )
 
         if hasattr(result, "error") and result.error:
@@ -121,18 +262,31 @@ async def upload_receipt(
                 detail="Failed to create receipt record",
             )
 
-        return ReceiptUploadResponse(
-            id=receipt["id"],
-            image_url=receipt["image_url"],
-            household_id=receipt["household_id"],
-            purchase_date=datetime.fromisoformat(receipt["purchase_date"]),
-            ocr_status=receipt.get("ocr_status"),
-            created_at=receipt.get("created_at"),
+        # Upload and OCR both run after the response is sent
+        background_tasks.add_task(
+            _run_receipt_upload,
+            image_path=image_path,
+            file_path=file_path,
+            file_extension=file_extension,
+            image_hash=hasher.hexdigest(),
+            receipt_id=receipt["id"],
+            user_id=current_user.id,
         )
 
+        # The row holds the storage path; there's no loadable URL until the
+        # background upload finishes
+        receipt["image_url"] = None
+
+        # response_model validates the row, parsing purchase_date itself
+        return receipt
+
     except HTTPException:
+        if file_path:
+            _remove_spooled_file(file_path)
         raise
     except Exception as e:
+        if file_path:
+            _remove_spooled_file(file_path)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to upload receipt: {str(e)}",
@@ -142,31 +296,46 @@ async def upload_receipt(
 @router.get("", response_model=List[Receipt])
 async def list_receipts(
     household_id: str,
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=MAX_RECEIPTS_PAGE_SIZE),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
 ):
     """
-    Get all receipts for a household.
+    Get a page of receipts for a household, newest first.
+
+    Pass the `X-Next-Cursor` response header back as `cursor` to fetch the
+    next page; the header is omitted on the last page.
 
     Requires:
     - Valid JWT token
-    - User must be a member of the household
+    - User must be a member of the household (otherwise the list is empty)
     """
     try:
-        # Verify user has access to the household
-        await verify_household_access(
-            household_id=household_id, current_user=current_user
+        # Runs under the caller's JWT, so the receipts RLS policy limits the
+        # rows to households the user belongs to
+        query = (
+            get_authenticated_async_supabase(request)
+            .table("receipts")
+            .select(RECEIPT_LIST_COLUMNS)
+            .eq("household_id", household_id)
         )
 
-        import asyncio
-
-        result = await asyncio.to_thread(
-            lambda: (
-                supabase.table("receipts")
-                .select("*")
-                .eq("household_id", household_id)
-                .order("created_at")
-                .execute()
+        if cursor:
+            created_at, receipt_id = _decode_receipt_cursor(cursor)
+            # Keyset: strictly after the last row of the previous page in
+            # (created_at desc, id desc) order
+            query = query.or_(
+                f'created_at.lt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.lt.{receipt_id})'
             )
+
+        result = await (
+            query.order("created_at", desc=True)
+            .order("id", desc=True)
+            .limit(limit)
+            .execute()
         )
 
         if hasattr(result, "error") and result.error:
@@ -175,7 +344,14 @@ async def list_receipts(
                 detail=f"Failed to fetch receipts: {result.error}",
             )
 
-        return result.data or []
+        receipts = result.data or []
+        if len(receipts) == limit:
+            last = receipts[-1]
+            response.headers["X-Next-Cursor"] = _encode_receipt_cursor(
+                last["created_at"], last["id"]
+            )
+
+        return await _with_image_urls(receipts)
 
     except HTTPException:
         raise
@@ -189,6 +365,7 @@ async def list_receipts(
 @router.get("/{receipt_id}", response_model=Receipt)
 async def get_receipt(
     receipt_id: str,
+    request: Request,
     current_user: User = Depends(get_current_user),
 ):
     """
@@ -199,37 +376,9 @@ async def get_receipt(
     - User must be a member of the household that owns the receipt
     """
     try:
-        import asyncio
-
-        # First, get the receipt to find its household_id
-        result = await asyncio.to_thread(
-            lambda: (
-                supabase.table("receipts")
-                .select("*")
-                .eq("id", receipt_id)
-                .single()
-                .execute()
-            )
-        )
-
-        if hasattr(result, "error") and result.error:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Receipt not found"
-            )
-
-        if not result.data:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Receipt not found"
-            )
+        receipt = await _get_accessible_receipt(request, receipt_id)
 
-        receipt = result.data
-
-        # Verify user has access to the household
-        await verify_household_access(
-            household_id=receipt["household_id"], current_user=current_user
-        )
-
-        return receipt
+        return (await _with_image_urls([receipt]))[0]
 
     except HTTPException:
         raise
@@ -240,17 +389,30 @@ async def get_receipt(
         )
 
 
+def _ocr_in_progress() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Receipt is already being processed",
+    )
+
+
 @router.post(
-    "/{receipt_id}/process-ocr", response_model=Receipt, status_code=status.HTTP_200_OK
+    "/{receipt_id}/process-ocr",
+    response_model=Receipt,
+    status_code=status.HTTP_202_ACCEPTED,
 )
 async def process_receipt_ocr(
     receipt_id: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
 ):
     """
-    Trigger OCR processing for a receipt using Veryfi API.
+    Start OCR processing for a receipt using Veryfi API.
 
-    This endpoint processes the receipt image and extracts data like:
+    The receipt is marked "processing" and returned immediately; OCR runs
+    after the response is sent. Poll `GET /receipts/{receipt_id}` until
+    `ocr_status` is "completed" or "failed". OCR extracts data like:
     - Store name
     - Total amount
     - Tax information
@@ -261,37 +423,12 @@ async def process_receipt_ocr(
     - Valid JWT token
     - User must be a member of the household that owns the receipt
     - Receipt must have an image_url
+    - Receipt must not already be processing (409 otherwise); uploads start
+      OCR themselves, so there's no need to call this after uploading
     """
     try:
-        from app.services.ocr_service import ocr_service
-
-        # First, get the receipt to find its household_id and image_url
-        result = await asyncio.to_thread(
-            lambda: (
-                supabase.table("receipts")
-                .select("*")
-                .eq("id", receipt_id)
-                .single()
-                .execute()
-            )
-        )
-
-        if hasattr(result, "error") and result.error:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Receipt not found"
-            )
-
-        if not result.data:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Receipt not found"
-            )
-
-        receipt = result.data
-
-        # Verify user has access to the household
-        await verify_household_access(
-            household_id=receipt["household_id"], current_user=current_user
-        )
+        # RLS-scoped fetch; doubles as the household access check
+        receipt = await _get_accessible_receipt(request, receipt_id)
 
         # Verify receipt has an image
         if not receipt.get("image_url"):
@@ -300,42 +437,41 @@ async def process_receipt_ocr(
                 detail="Receipt does not have an image",
             )
 
-        # Trigger OCR processing (non-blocking - process in background)
-        # In production, this could be queued to a background task
-        try:
-            await ocr_service.process_receipt_from_url(
-                image_url=receipt["image_url"],
-                receipt_id=receipt_id,
-                household_id=receipt["household_id"],
-                user_id=current_user.id,
-            )
-
-            # Fetch and return updated receipt
-            updated_result = await asyncio.to_thread(
-                lambda: (
-                    supabase.table("receipts")
-                    .select("*")
-                    .eq("id", receipt_id)
-                    .single()
-                    .execute()
-                )
+        if receipt.get("ocr_status") == "processing":
+            raise _ocr_in_progress()
+
+        # The stored URL may have expired; hand Veryfi a fresh one
+        image_url = receipt["image_url"]
+        image_path = receipt_image_path(image_url)
+        if image_path:
+            image_url = await get_receipt_image_url(image_path)
+
+        # Conditional, so of two racing requests only one claims the run
+        result = await (
+            get_async_supabase_admin()
+            .table("receipts")
+            .update(
+                {
+                    "ocr_status": "processing",
+                    "updated_at": utcnow_iso(),
+                }
             )
+            .eq("id", receipt_id)
+            .or_("ocr_status.is.null,ocr_status.neq.processing")
+            .execute()
+        )
 
-            if hasattr(updated_result, "error") and updated_result.error:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Failed to fetch updated receipt",
-                )
+        if not result.data:
+            raise _ocr_in_progress()
 
-            return updated_result.data
+        background_tasks.add_task(
+            _run_receipt_ocr,
+            image_url=image_url,
+            receipt_id=receipt_id,
+            user_id=current_user.id,
+        )
 
-        except Exception as e:
-            # OCR processing failed, but receipt still exists
-            # The error has been stored in the receipt record
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"OCR processing failed: {str(e)}",
-            )
+        return (await _with_image_urls(result.data[:1]))[0]
 
     except HTTPException:
         raise
@@ -1,10 +1,30 @@
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+
+@lru_cache(maxsize=512)
+def _split_path(path):
+    return tuple(path.split("."))
+
+
 def get_nested(data, path, default=None):
-    keys = path.split(".")
+    """
+    Walk nested dicts along a dotted path ("a.b.c") or a pre-split key tuple.
+
+    Hot callers should pass tuples built once at import time.
+    """
+    keys = path if type(path) is tuple else _split_path(path)
     for key in keys:
-        if isinstance(data, dict):
-            data = data.get(key)
-        else:
+        # Exact type check first: JSON payloads are plain dicts
+        if type(data) is not dict and not isinstance(data, dict):
             return default
+        data = data.get(key)
         if data is None:
             return default
     return data
+
+
+def utcnow_iso(ago: float = 0) -> str:
+    """Current UTC time, less `ago` seconds, as a Z-suffixed ISO 8601 string."""
+    moment = datetime.now(timezone.utc) - timedelta(seconds=ago)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
@@ -1,10 +1,9 @@
-import asyncio
 from typing import Any, Dict, Optional
 
 from fastapi import HTTPException
 
-from app.core.supabase import supabase
-from app.models.auth import User, UserResponse
+from app.core.supabase import get_async_supabase_admin
+from app.models.auth import User
 
 
 def _resp_data(resp: Any) -> Optional[Any]:
@@ -29,55 +28,44 @@ def _resp_error(resp: Any) -> Optional[Any]:
     return None
 
 
-async def get_primary_household_id(user: User) -> UserResponse | None:
-    result = await asyncio.to_thread(
-        lambda: (
-            supabase.table("household_members")
-            .select("household_id")
-            .eq("user_id", user.id)
-            .limit(1)
-            .execute()
+async def _get_or_create_primary_household(user: User, name: Optional[str]):
+    return await (
+        get_async_supabase_admin()
+        .rpc(
+            "get_or_create_primary_household",
+            {"p_user_id": user.id, "p_email": user.email, "p_name": name},
         )
+        .execute()
     )
 
-    data = _resp_data(result)
-    if data:
-        return data
 
-    return None
+async def get_or_create_primary_household(
+    user: User, name: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Return the user's primary household row, creating it if they have none.
 
+    The lookup and the create run in one DB RPC that serializes concurrent
+    calls for the same user, so a first login racing itself can't create two
+    households.
 
-async def create_default_household(user: User, name: str):
-    # Use DB-side RPC to create the household and member in one atomic operation.
-    # This ensures the DB sets `created_by` (so RLS WITH CHECK passes) and
-    # avoids any client-side mismatch with auth.uid().
-    rpc_result = await asyncio.to_thread(
-        lambda: supabase.rpc(
-            "create_household_with_member",
-            {"payload": {"user_id": user.id, "email": user.email, "name": name}},
-        ).execute()
-    )
+    Args:
+        user: The user whose household to resolve
+        name: Name for a newly created household (defaults to "<email>'s Household")
 
-    rpc_err = _resp_error(rpc_result)
-    if rpc_err:
-        raise HTTPException(
-            status_code=500, detail=f"Failed in create_household: {rpc_err}"
-        )
+    Returns:
+        The household row
+
+    Raises:
+        HTTPException: If the RPC returns no household
+    """
+    rpc_result = await _get_or_create_primary_household(user, name)
 
-    rpc_data = _resp_data(rpc_result)
-    if not rpc_data:
+    household_row = _resp_data(rpc_result)
+    if not household_row:
         raise HTTPException(
-            status_code=500, detail="Failed in create_household: no data returned"
+            status_code=500,
+            detail="Failed to get/create household: no data returned",
         )
 
-    household_row = rpc_data[0] if isinstance(rpc_data, list) else rpc_data
     return household_row
-
-
-async def get_or_create_primary_household(user: User, name: str):
-    household_id = await get_primary_household_id(user)
-
-    if household_id:
-        return household_id
-
-    return await create_default_household(user, name)
@@ -1,16 +1,91 @@
 import asyncio
 import logging
-from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import httpx
-from helpers import get_nested
+import msgspec
 
 from app.core.config import settings
-from app.core.supabase import supabase
+from app.core.supabase import get_async_supabase_admin
+from app.services.helpers import get_nested, utcnow_iso
 
 logger = logging.getLogger(__name__)
 
+# Hardcoded constants going to change when we get categories working
+OTHER_CATEGORY_ID = "1884005d-dcbe-4632-b99e-ad379778e500"
+DEFAULT_STORAGE = "fridge"
+
+
+if sys.version_info >= (3, 11):
+    # fromisoformat accepts a trailing "Z" natively
+    _parse_iso_datetime = datetime.fromisoformat
+else:
+
+    def _parse_iso_datetime(value: str) -> datetime:
+        if value.endswith("Z"):
+            value = value[:-1] + "+00:00"
+        return datetime.fromisoformat(value)
+
+
+class _Value(msgspec.Struct):
+    """A Veryfi field wrapper: {"value": ...}."""
+
+    value: Any = None
+
+
+# Veryfi fields are usually {"value": ...} objects, but tolerate bare values or
+# nulls the way get_nested did instead of failing the whole receipt
+_Field = Union[_Value, str, int, float, bool, list, None]
+
+# The same leniency for objects: a non-object where Veryfi normally sends one
+# decodes as-is and is treated as missing by the extractor
+_NonObject = Union[str, int, float, bool, list, None]
+
+
+class _Vendor(msgspec.Struct):
+    name: _Field = None
+
+
+class _Payment(msgspec.Struct):
+    type: _Field = None
+
+
+class _Meta(msgspec.Struct):
+    exif: Any = None
+
+
+class VeryfiReceipt(msgspec.Struct):
+    """
+    The parts of a Veryfi response the OCR job uses.
+
+    Decoded straight from the response bytes, so unused fields are skipped
+    rather than built into Python objects.
+    """
+
+    vendor: Union[_Vendor, _NonObject] = None
+    total: _Field = None
+    subtotal: _Field = None
+    tax: _Field = None
+    currency_code: _Field = None
+    date: _Field = None
+    payment: Union[_Payment, _NonObject] = None
+    invoice_number: _Field = None
+    meta: Union[_Meta, _NonObject] = None
+    # Items that aren't objects are dropped by the extractor
+    line_items: Any = None
+
+
+def _value(field: Any, default: Any = None) -> Any:
+    if type(field) is _Value and field.value is not None:
+        return field.value
+    return default
+
+
+_decode_veryfi_receipt = msgspec.json.Decoder(VeryfiReceipt).decode
+_EXPANDED_DESCRIPTION = ("product_info", "expanded_description")
+
 
 class VeryfiOCRService:
     """Service for handling Veryfi OCR operations."""
@@ -21,6 +96,22 @@ class VeryfiOCRService:
         self.api_key = settings.VERYFI_API_KEY
         self.username = settings.VERYFI_USERNAME
         self.base_url = settings.VERYFI_URL
+        # Long-lived client so receipts reuse Veryfi connections instead of
+        # paying a TCP+TLS handshake each time
+        self._client = httpx.AsyncClient(
+            timeout=60.0,
+            limits=httpx.Limits(
+                max_connections=settings.VERYFI_MAX_CONCURRENCY,
+                max_keepalive_connections=settings.VERYFI_MAX_CONCURRENCY,
+            ),
+            http2=True,
+        )
+        # Queue excess calls here rather than letting Veryfi reject or time them out
+        self._veryfi_slots = asyncio.Semaphore(settings.VERYFI_MAX_CONCURRENCY)
+
+    async def aclose(self) -> None:
+        """Close the pooled Veryfi connections."""
+        await self._client.aclose()
 
     def _get_auth_header(self) -> str:
         """
@@ -35,61 +126,55 @@ class VeryfiOCRService:
         self,
         image_url: str,
         receipt_id: str,
-        household_id: str,
         user_id: str,
+        image_hash: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         Process a receipt image from a URL using Veryfi OCR.
 
+        The caller marks the receipt "processing" before starting; this sets
+        it to "completed" or "failed" when done.
+
         Args:
             image_url: The public URL of the receipt image (from Supabase Storage)
             receipt_id: The ID of the receipt record in the database
-            household_id: The household ID for the receipt
             user_id: The ID of the user who uploaded the receipt (for added_by)
+            image_hash: Content hash of the image; when given, an earlier OCR
+                result for the same bytes is reused instead of calling Veryfi
 
         Returns:
-            Dictionary with OCR results containing extracted data
+            The updated receipt row
         """
         try:
-            # Update receipt status to "processing"
-            await self._update_receipt_status(receipt_id, "processing")
+            ocr_response = None
+            if image_hash:
+                ocr_response = await self._get_cached_ocr_response(image_hash)
 
-            # Call Veryfi API
-            ocr_response = await self._call_veryfi_api(image_url)
+            if ocr_response is None:
+                # Call Veryfi API
+                ocr_response = await self._call_veryfi_api(image_url)
+                if image_hash:
+                    await self._cache_ocr_response(image_hash, ocr_response)
 
-            if not ocr_response:
+            if ocr_response is None:
                 raise Exception("Empty response from Veryfi API")
 
             # Extract relevant data from Veryfi response
             extracted_data = self._extract_data_from_response(ocr_response)
+            # Only the extracted fields are needed from here on
+            del ocr_response
 
-            # Update receipt with OCR results
-            await self._update_receipt_with_ocr_data(receipt_id, extracted_data)
-
-            try:
-                await self._create_food_items_from_receipt(
-                    receipt_id=receipt_id,
-                    household_id=household_id,
-                    user_id=user_id,
-                    extracted_data=extracted_data,
-                )
-            except Exception as e:
-                logger.error(
-                    f"Failed to create food items for receipt {receipt_id}: {str(e)}"
-                )
-
-            await self._update_receipt_status(receipt_id, "completed")
-
-            return extracted_data
+            # Store OCR results, create food items and mark the receipt
+            # completed in one transaction
+            return await self._finalize_receipt(receipt_id, user_id, extracted_data)
 
         except Exception as e:
-            logger.error(f"OCR processing failed for receipt {receipt_id}: {str(e)}")
-            await self._update_receipt_status(
-                receipt_id, "failed", error_message=str(e)
-            )
+            # The one place OCR failures are logged; helpers below just raise
+            logger.exception(f"OCR processing failed for receipt {receipt_id}")
+            await self.update_receipt_status(receipt_id, "failed", error_message=str(e))
             raise
 
-    async def _call_veryfi_api(self, image_url: str) -> Dict[str, Any]:
+    async def _call_veryfi_api(self, image_url: str) -> VeryfiReceipt:
         """
         Call Veryfi API with the image as base64-encoded data.
 
@@ -100,7 +185,7 @@ class VeryfiOCRService:
             image_url: The public URL of the receipt image
 
         Returns:
-            The JSON response from Veryfi API
+            The fields of the Veryfi response the OCR job uses
         """
         headers = {
             "Accept": "application/json",
@@ -115,73 +200,117 @@ class VeryfiOCRService:
         }
 
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(
+            async with self._veryfi_slots:
+                response = await self._client.post(
                     self.base_url,
                     json=payload,
                     headers=headers,
                 )
+        except httpx.RequestError as e:
+            raise Exception(f"Failed to connect to Veryfi API: {str(e)}") from e
 
-                # Check for HTTP errors
-                if response.status_code >= 400:
-                    logger.error(
-                        f"Veryfi API error {response.status_code}: {response.text}"
-                    )
-                    raise Exception(
-                        f"Veryfi API error: {response.status_code} - {response.text}"
-                    )
+        # Check for HTTP errors
+        if response.status_code >= 400:
+            raise Exception(
+                f"Veryfi API error: {response.status_code} - {response.text}"
+            )
 
-                return response.json()
+        return _decode_veryfi_receipt(response.content)
 
-        except httpx.RequestError as e:
-            logger.error(f"Veryfi API request failed: {str(e)}")
-            raise Exception(f"Failed to connect to Veryfi API: {str(e)}")
+    async def _get_cached_ocr_response(
+        self, image_hash: str
+    ) -> Optional[VeryfiReceipt]:
+        """
+        Look up a stored Veryfi response for an image hash.
+
+        Args:
+            image_hash: Content hash of the receipt image
+
+        Returns:
+            The stored response, or None on a miss or lookup error
+        """
+        try:
+            result = await (
+                get_async_supabase_admin()
+                .table("receipt_ocr_cache")
+                .select("response")
+                .eq("image_hash", image_hash)
+                .maybe_single()
+                .execute()
+            )
         except Exception as e:
-            logger.error(f"Veryfi API call error: {str(e)}")
-            raise
+            logger.warning(f"OCR cache lookup failed: {str(e)}")
+            return None
+
+        if result is None or not result.data:
+            return None
+        try:
+            receipt = msgspec.convert(result.data["response"], VeryfiReceipt)
+        except msgspec.ValidationError as e:
+            logger.warning(f"Ignoring unreadable OCR cache entry: {str(e)}")
+            return None
+        logger.info(f"OCR cache hit for image {image_hash}")
+        return receipt
+
+    async def _cache_ocr_response(
+        self, image_hash: str, ocr_response: VeryfiReceipt
+    ) -> None:
+        """
+        Store a Veryfi response under its image hash. Failures are only logged.
+
+        Args:
+            image_hash: Content hash of the receipt image
+            ocr_response: The decoded Veryfi response
+        """
+        try:
+            await (
+                get_async_supabase_admin()
+                .table("receipt_ocr_cache")
+                .upsert(
+                    {
+                        "image_hash": image_hash,
+                        "response": msgspec.to_builtins(ocr_response),
+                    },
+                    ignore_duplicates=True,
+                )
+                .execute()
+            )
+        except Exception as e:
+            logger.warning(f"Failed to cache OCR response: {str(e)}")
 
     def _extract_data_from_response(
-        self, veryfi_response: Dict[str, Any]
+        self, veryfi_response: VeryfiReceipt
     ) -> Dict[str, Any]:
         """
         Extract relevant data from Veryfi API response.
 
         Args:
-            veryfi_response: The full response from Veryfi API
+            veryfi_response: The decoded Veryfi response
 
         Returns:
             Simplified dictionary with extracted data
         """
-        try:
-            extracted = {
-                "store_name": get_nested(
-                    veryfi_response, "vendor.name.value", "Unknown"
-                ),
-                "total_amount": get_nested(veryfi_response, "total.value", None),
-                "subtotal": get_nested(veryfi_response, "subtotal.value", None),
-                "tax": get_nested(veryfi_response, "tax.value", None),
-                "currency": get_nested(veryfi_response, "currency_code.value", None),
-                "purchase_date": get_nested(veryfi_response, "date.value", None),
-                "line_items": veryfi_response.get("line_items", []),
-                "payment_method": get_nested(
-                    veryfi_response, "payment.type.value", None
-                ),
-                "document_reference": get_nested(
-                    veryfi_response, "invoice_number.value", None
-                ),
-                "ocr_confidence": get_nested(
-                    veryfi_response, "meta.exif.AFConfidence", None
-                ),
-                "raw_response": veryfi_response,  # Store full response for debugging
-            }
-
-            return extracted
-
-        except Exception as e:
-            logger.error(f"Error extracting data from Veryfi response: {str(e)}")
-            raise
+        r = veryfi_response
+        vendor = r.vendor if type(r.vendor) is _Vendor else None
+        payment = r.payment if type(r.payment) is _Payment else None
+        exif = r.meta.exif if type(r.meta) is _Meta else None
+        line_items = r.line_items if type(r.line_items) is list else ()
+        return {
+            "store_name": _value(vendor.name if vendor else None, "Unknown"),
+            "total_amount": _value(r.total),
+            "subtotal": _value(r.subtotal),
+            "tax": _value(r.tax),
+            "currency": _value(r.currency_code),
+            "purchase_date": _value(r.date),
+            "line_items": [item for item in line_items if type(item) is dict],
+            "payment_method": _value(payment.type if payment else None),
+            "document_reference": _value(r.invoice_number),
+            "ocr_confidence": (
+                exif.get("AFConfidence") if type(exif) is dict else None
+            ),
+        }
 
-    async def _update_receipt_status(
+    async def update_receipt_status(
         self,
         receipt_id: str,
         status: str,
@@ -196,288 +325,192 @@ class VeryfiOCRService:
             error_message: Optional error message if status is "failed"
         """
         try:
-            update_data = {
-                "ocr_status": status,
-                "updated_at": datetime.now(timezone.utc)
-                .isoformat(timespec="microseconds")
-                .replace("+00:00", "Z"),
-            }
-
-            if error_message:
-                update_data["processing_error"] = error_message
-
-            def update_receipt():
-                return (
-                    supabase.table("receipts")
-                    .update(update_data)
-                    .eq("id", receipt_id)
-                    .execute()
+            result = await (
+                get_async_supabase_admin()
+                .table("receipts")
+                .update(
+                    {
+                        "ocr_status": status,
+                        "updated_at": utcnow_iso(),
+                        **(
+                            {"processing_error": error_message} if error_message else {}
+                        ),
+                    }
                 )
-
-            result = await asyncio.to_thread(update_receipt)
+                .eq("id", receipt_id)
+                .execute()
+            )
 
             if hasattr(result, "error") and result.error:
-                logger.error(f"Failed to update receipt status: {result.error}")
                 raise Exception(f"Database error: {result.error}")
 
         except Exception as e:
+            # Don't re-raise: this runs while handling the original OCR error
             logger.error(f"Error updating receipt status: {str(e)}")
-            # Don't re-raise here as this is an internal operation
 
-    async def _update_receipt_with_ocr_data(
-        self,
-        receipt_id: str,
-        extracted_data: Dict[str, Any],
-    ) -> None:
+    async def fail_stale_receipts(self, max_age: int) -> None:
         """
-        Update the receipt record with extracted OCR data.
+        Mark receipts stuck in "processing" for over `max_age` seconds as failed.
 
-        Args:
-            receipt_id: The ID of the receipt record
-            extracted_data: The extracted data from OCR processing
+        Uploads and OCR run as in-process background tasks, so a worker that
+        dies mid-job would otherwise leave its receipts processing forever.
         """
         try:
-            # Prepare update payload with extracted OCR data
-            update_data = {
-                "store_name": extracted_data.get("store_name"),
-                "total_amount": extracted_data.get("total_amount"),
-                "ocr_confidence": extracted_data.get("ocr_confidence", 0),
-                "updated_at": datetime.now(timezone.utc)
-                .isoformat(timespec="microseconds")
-                .replace("+00:00", "Z"),
-            }
-
-            def update_receipt():
-                return (
-                    supabase.table("receipts")
-                    .update(update_data)
-                    .eq("id", receipt_id)
-                    .execute()
+            result = await (
+                get_async_supabase_admin()
+                .table("receipts")
+                .update(
+                    {
+                        "ocr_status": "failed",
+                        "processing_error": "Processing timed out",
+                        "updated_at": utcnow_iso(),
+                    }
                 )
-
-            result = await asyncio.to_thread(update_receipt)
-
-            if hasattr(result, "error") and result.error:
-                logger.error(f"Failed to update receipt with OCR data: {result.error}")
-                raise Exception(f"Database error: {result.error}")
-
-            logger.info(f"Receipt {receipt_id} updated with OCR data")
+                .eq("ocr_status", "processing")
+                .lt("updated_at", utcnow_iso(ago=max_age))
+                .execute()
+            )
+            if result.data:
+                logger.warning(f"Marked {len(result.data)} stale receipts failed")
 
         except Exception as e:
-            logger.error(f"Error updating receipt with OCR data: {str(e)}")
-            raise
+            logger.error(f"Error failing stale receipts: {str(e)}")
 
-    async def _create_food_items_from_receipt(
+    async def _finalize_receipt(
         self,
         receipt_id: str,
-        household_id: str,
         user_id: str,
         extracted_data: Dict[str, Any],
-    ) -> None:
+        status: str = "completed",
+    ) -> Dict[str, Any]:
         """
-        Create food items from receipt line items.
+        Write the OCR results, food items and final status in one RPC.
+
+        The finalize_receipt function updates the receipt and inserts its food
+        items in a single transaction, filling in each item's expiry date from
+        its category's default shelf life.
 
         Args:
-            receipt_id: The ID of the receipt
-            household_id: The household ID
-            user_id: The user ID (added_by)
+            receipt_id: The ID of the receipt record
+            user_id: The user ID (added_by on the food items)
             extracted_data: The extracted data from OCR processing
+            status: The final OCR status to set
+
+        Returns:
+            The updated receipt row
         """
-        try:
-            line_items = extracted_data.get("line_items", [])
-            if not line_items:
-                logger.info(f"No line items found for receipt {receipt_id}")
-                return
-
-            # Fetch the purchase date from extracted data
-            purchase_date = extracted_data.get("purchase_date")
-            if isinstance(purchase_date, str):
-                purchase_date = datetime.fromisoformat(
-                    purchase_date.replace("Z", "+00:00")
-                )
-            elif isinstance(purchase_date, datetime):
-                pass
-            else:
-                # Fallback to now if not available
-                purchase_date = datetime.now(timezone.utc)
-
-            # Hardcoded constants going to change when we get categories working
-            OTHER_CATEGORY_ID = "1884005d-dcbe-4632-b99e-ad379778e500"
-            DEFAULT_STORAGE = "fridge"
-            DEFAULT_EXPIRY_DAYS = 30  # Fallback: 30 days if category has no default
-
-            # Fetch default expiry days for the "other" category
-            default_expiry_days = await self._get_category_default_expiry(
-                OTHER_CATEGORY_ID
+        food_items, purchase_date = self._build_food_items(receipt_id, extracted_data)
+
+        result = await (
+            get_async_supabase_admin()
+            .rpc(
+                "finalize_receipt",
+                {
+                    "p_receipt_id": receipt_id,
+                    "p_receipt": {
+                        "store_name": extracted_data.get("store_name"),
+                        "total_amount": extracted_data.get("total_amount"),
+                        "ocr_confidence": extracted_data.get("ocr_confidence", 0),
+                        "ocr_status": status,
+                    },
+                    "p_items": food_items,
+                    "p_added_by": user_id,
+                    "p_purchase_date": purchase_date,
+                },
             )
+            .execute()
+        )
 
-            # Use fallback if category default not found
-            if default_expiry_days is None:
-                default_expiry_days = DEFAULT_EXPIRY_DAYS
-                logger.info(f"Using fallback expiry days: {DEFAULT_EXPIRY_DAYS} days")
-
-            # Transform line items to food items
-            food_items = []
-            for line_item in line_items:
-                try:
-                    name = self._extract_line_item_name(line_item)
-                    if not name:
-                        logger.warning(f"Skipping line item with no name: {line_item}")
-                        continue
-
-                    price = self._extract_line_item_price(line_item)
-                    quantity = self._extract_line_item_quantity(line_item)
-
-                    # Calculate expiry date - always provide a value
-                    if default_expiry_days and default_expiry_days > 0:
-                        from datetime import timedelta
-
-                        expiry_date = purchase_date + timedelta(
-                            days=default_expiry_days
-                        )
-                    else:
-                        # Fallback: use 30 days if somehow it's still invalid
-                        from datetime import timedelta
-
-                        expiry_date = purchase_date + timedelta(days=30)
-
-                    food_item = {
-                        "household_id": household_id,
-                        "receipt_id": receipt_id,
-                        "added_by": user_id,
-                        "name": name,
-                        "category_id": OTHER_CATEGORY_ID,
-                        "price": price,
-                        "quantity": quantity,
-                        "unit": None,
-                        "purchase_date": purchase_date.isoformat(
-                            timespec="microseconds"
-                        ).replace("+00:00", "Z"),
-                        "expiry_date": expiry_date.isoformat(
-                            timespec="microseconds"
-                        ).replace("+00:00", "Z"),
-                        "manual_expiry": False,
-                        "is_consumed": False,
-                        "storage_location": DEFAULT_STORAGE,
-                    }
-                    food_items.append(food_item)
-
-                except Exception as e:
-                    logger.warning(f"Error processing line item: {str(e)}, skipping...")
-                    continue
-
-            if not food_items:
-                logger.info(f"No valid food items to create for receipt {receipt_id}")
-                return
-
-            # Batch insert food items
-            def insert_food_items():
-                return supabase.table("food_items").insert(food_items).execute()
-
-            result = await asyncio.to_thread(insert_food_items)
-
-            if hasattr(result, "error") and result.error:
-                raise Exception(f"Database error: {result.error}")
+        if hasattr(result, "error") and result.error:
+            raise Exception(f"Database error: {result.error}")
 
-            logger.info(
-                f"Created {len(food_items)} food items for receipt {receipt_id}"
-            )
+        logger.info(
+            f"Receipt {receipt_id} updated with OCR data and "
+            f"{len(food_items)} food items"
+        )
 
-        except Exception as e:
-            logger.error(f"Error creating food items from receipt: {str(e)}")
-            raise
+        return result.data
 
-    async def _get_category_default_expiry(self, category_id: str) -> Optional[int]:
+    def _build_food_items(
+        self, receipt_id: str, extracted_data: Dict[str, Any]
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
         """
-        Get the default shelf life days for a food category.
+        Turn receipt line items into food item rows for finalize_receipt.
 
         Args:
-            category_id: The ID of the food category
+            receipt_id: The ID of the receipt
+            extracted_data: The extracted data from OCR processing
 
         Returns:
-            The default shelf life days, or None if not found
+            The food items, and the purchase date as an ISO string (None to
+            let the database use the current time)
         """
-        try:
-
-            def fetch_category():
-                return (
-                    supabase.table("food_categories")
-                    .select("default_shelf_life_days")
-                    .eq("id", category_id)
-                    .single()
-                    .execute()
+        line_items = extracted_data.get("line_items", [])
+        if not line_items:
+            logger.info(f"No line items found for receipt {receipt_id}")
+            return [], None
+
+        # Fields are read inline: this loop runs for every line item
+        food_items = []
+        for line_item in line_items:
+            try:
+                # Try different possible name fields
+                name = (
+                    line_item.get("description")
+                    or line_item.get("full_description")
+                    or line_item.get("normalized_description")
+                    or get_nested(line_item, _EXPANDED_DESCRIPTION)
                 )
+                name = name.strip() if name else None
+                if not name:
+                    logger.warning(f"Skipping line item with no name: {line_item}")
+                    continue
 
-            result = await asyncio.to_thread(fetch_category)
-
-            if hasattr(result, "error") and result.error:
-                logger.warning(
-                    f"Could not fetch category {category_id}: {result.error}"
-                )
-                return None
+                # Price and quantity default to 1 if missing or unparseable
+                price = line_item.get("total") or line_item.get("price")
+                try:
+                    price = float(price) if price else 1.0
+                except (ValueError, TypeError):
+                    price = 1.0
 
-            if result.data:
-                return result.data.get("default_shelf_life_days")
-            return None
+                quantity = line_item.get("quantity")
+                try:
+                    quantity = int(quantity) if quantity else 1
+                except (ValueError, TypeError):
+                    quantity = 1
 
-        except Exception as e:
-            logger.warning(f"Error fetching category default expiry: {str(e)}")
-            return None
+                food_items.append(
+                    {
+                        "name": name,
+                        "category_id": OTHER_CATEGORY_ID,
+                        "price": price,
+                        "quantity": quantity,
+                        "storage_location": DEFAULT_STORAGE,
+                    }
+                )
 
-    def _extract_line_item_name(self, line_item: Dict[str, Any]) -> Optional[str]:
-        """
-        Extract the item name from a Veryfi line item.
+            except Exception as e:
+                logger.warning(f"Error processing line item: {str(e)}, skipping...")
+                continue
 
-        Args:
-            line_item: The line item from Veryfi response
+        if not food_items:
+            logger.info(f"No valid food items to create for receipt {receipt_id}")
+            return [], None
 
-        Returns:
-            The item name, or None if not found
-        """
-        # Try different possible name fields
-        name = (
-            line_item.get("description")
-            or line_item.get("full_description")
-            or line_item.get("normalized_description")
-            or get_nested(line_item, "product_info.expanded_description")
+        # Fetch the purchase date from extracted data
+        purchase_date = extracted_data.get("purchase_date")
+        if isinstance(purchase_date, str):
+            try:
+                purchase_date = _parse_iso_datetime(purchase_date)
+            except ValueError:
+                logger.warning(f"Unparseable purchase date: {purchase_date}")
+                return food_items, None
+        elif not isinstance(purchase_date, datetime):
+            return food_items, None
+
+        return food_items, purchase_date.isoformat(timespec="microseconds").replace(
+            "+00:00", "Z"
         )
-        return name.strip() if name else None
-
-    def _extract_line_item_price(self, line_item: Dict[str, Any]) -> float:
-        """
-        Extract the price from a Veryfi line item.
-
-        Defaults to 1 if not found.
-
-        Args:
-            line_item: The line item from Veryfi response
-
-        Returns:
-            The price, or 1.0 if not found
-        """
-        price = line_item.get("total") or line_item.get("price")
-        try:
-            return float(price) if price else 1.0
-        except (ValueError, TypeError):
-            return 1.0
-
-    def _extract_line_item_quantity(self, line_item: Dict[str, Any]) -> int:
-        """
-        Extract the quantity from a Veryfi line item.
-
-        Defaults to 1 if not found.
-
-        Args:
-            line_item: The line item from Veryfi response
-
-        Returns:
-            The quantity, or 1 if not found
-        """
-        quantity = line_item.get("quantity")
-        try:
-            return int(quantity) if quantity else 1
-        except (ValueError, TypeError):
-            return 1
 
 
 ocr_service = VeryfiOCRService()
@@ -1,66 +1,398 @@
 import asyncio
+import logging
+import time
 import uuid
-from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
 
+import httpx
+import jwt
+from cachetools import TTLCache
 from fastapi import HTTPException, status
+from storage3.exceptions import StorageApiError
 
-from app.core.supabase import supabase_admin
+from app.core.batching import AsyncBatcher
+from app.core.config import settings
+from app.core.supabase import get_async_supabase_admin
 from app.models.auth import User
 
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
 EXPIRES_IN = 300
 
+# Content-Type stored with each image, by file extension. Anything else is
+# rejected before a path is handed out.
+CONTENT_TYPES = {
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+}
 
-async def upload_receipt_image(
-    file_content: bytes,
-    file_extension: str,
+# Public images never change under their (unique) path, so browsers and the
+# CDN may keep them for a year
+PUBLIC_CACHE_CONTROL = "31536000"
+
+STORAGE_RETRY_ATTEMPTS = 3
+
+# Storage's remove endpoint accepts at most this many paths per call
+REMOVE_BATCH_SIZE = 1000
+
+# Storage accepts signed-URL tokens made with the project's JWT secret, so
+# holding it lets us sign without a request to Supabase
+_SIGN_KEY = (
+    settings.SUPABASE_JWT_SECRET.encode() if settings.SUPABASE_JWT_SECRET else None
+)
+
+# Signed URLs are reused for half their lifetime, so anything handed out from
+# the cache stays valid for at least EXPIRES_IN / 2 seconds
+_signed_urls: TTLCache = TTLCache(maxsize=10_000, ttl=EXPIRES_IN // 2)
+# In-flight signing requests, so concurrent callers for one path share a call
+_signing: Dict[str, asyncio.Future] = {}
+
+# Full URL prefixes of objects in the 'receipts' bucket. Matching on the whole
+# prefix also rejects URLs that only mimic the path on another host.
+_RECEIPT_URL_PREFIXES = tuple(
+    f"{settings.SUPABASE_URL.rstrip('/')}/storage/v1/object/{kind}/receipts/"
+    for kind in ("sign", "public")
+)
+
+
+def _storage_status(error: StorageApiError) -> Optional[int]:
+    try:
+        return int(error.status)
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_transient(error: Exception) -> bool:
+    """Network failures and Storage 5xx responses are worth retrying; 4xx aren't."""
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, StorageApiError):
+        code = _storage_status(error)
+        return code is not None and code >= 500
+    return False
+
+
+def _storage_http_error(error: Exception, action: str) -> HTTPException:
+    """
+    Map a failed Storage call to the response the client should see.
+
+    Storage's 4xx errors are passed through as-is, other Storage errors are
+    a bad gateway, and timeouts or unreachable Storage are a gateway timeout.
+    """
+    if isinstance(error, StorageApiError):
+        code = _storage_status(error)
+        if code is None or not 400 <= code < 500:
+            code = status.HTTP_502_BAD_GATEWAY
+        return HTTPException(status_code=code, detail=f"{action}: {error.message}")
+    if isinstance(error, (httpx.TimeoutException, httpx.ConnectError)):
+        return HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=f"{action}: Storage timed out",
+        )
+    return HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=f"{action}: {error}",
+    )
+
+
+async def _with_retry(call: Callable[[], Awaitable[T]]) -> T:
+    """
+    Run a Storage call, retrying transient failures with exponential backoff.
+
+    Waits 1s, then 2s, ... between attempts, up to STORAGE_RETRY_ATTEMPTS in all.
+    """
+    for attempt in range(STORAGE_RETRY_ATTEMPTS - 1):
+        try:
+            return await call()
+        except Exception as e:
+            if not _is_transient(e):
+                raise
+            await asyncio.sleep(2**attempt)
+    return await call()
+
+
+def _is_missing_object(error: Exception) -> bool:
+    # Older Storage versions report a missing object as a 400 "not_found"
+    return isinstance(error, StorageApiError) and (
+        _storage_status(error) == 404 or error.code in ("not_found", "NoSuchKey")
+    )
+
+
+def _signing_http_error(error: Exception) -> HTTPException:
+    """Map a failed signing call: 404 if the image is gone, 503 if Storage is."""
+    if _is_missing_object(error):
+        return HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Receipt image not found",
+        )
+    if _is_transient(error):
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Storage is unavailable, try again shortly",
+        )
+    return _storage_http_error(error, "Failed to get signed URL")
+
+
+def _signed_url_from_result(result) -> str:
+    """Pull the URL out of a create_signed_url response, raising on errors."""
+    if isinstance(result, dict):
+        if result.get("error"):
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to get signed URL: {result['error']}",
+            )
+
+        signed_url = result.get("signedURL")
+        if signed_url:
+            return signed_url
+
+    raise HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail="Failed to get signed URL",
+    )
+
+
+def receipt_image_path(image_url: str) -> Optional[str]:
+    """
+    Get the storage path of a receipt image from receipts.image_url.
+
+    New rows store the path itself; older rows hold a signed or public URL.
+
+    Returns:
+        The path within the 'receipts' bucket, or None if it isn't one
+    """
+    if not image_url.startswith(("http://", "https://")):
+        return image_url
+    for prefix in _RECEIPT_URL_PREFIXES:
+        if image_url.startswith(prefix):
+            # Drop the signed-URL token, if any
+            return image_url[len(prefix) :].partition("?")[0]
+    return None
+
+
+def _sign_url(path: str, expires_in: int) -> str:
+    """Build a signed URL locally, the same way Storage's sign endpoint does."""
+    now = int(time.time())
+    token = jwt.encode(
+        {"url": f"receipts/{path}", "iat": now, "exp": now + expires_in},
+        _SIGN_KEY,
+        algorithm="HS256",
+    )
+    return (
+        f"{settings.SUPABASE_URL.rstrip('/')}/storage/v1/object/sign/"
+        f"receipts/{path}?token={token}"
+    )
+
+
+async def _create_signed_url(path: str) -> str:
+    if _SIGN_KEY:
+        signed_url = _sign_url(path, EXPIRES_IN)
+    else:
+        try:
+            result = await _with_retry(
+                lambda: get_async_supabase_admin()
+                .storage.from_("receipts")
+                .create_signed_url(path, EXPIRES_IN)
+            )
+        except Exception as e:
+            raise _signing_http_error(e) from e
+        signed_url = _signed_url_from_result(result)
+    _signed_urls[path] = signed_url
+    return signed_url
+
+
+async def get_signed_url(path: str) -> str:
+    """
+    Get a signed URL for a receipt image, reusing a recent one when possible.
+
+    Args:
+        path: Storage path of the image in the 'receipts' bucket
+
+    Returns:
+        A signed URL valid for at least EXPIRES_IN / 2 seconds
+
+    Raises:
+        HTTPException: 404 if the image doesn't exist, 503 if Storage is
+            briefly unavailable, or another error status if signing fails
+    """
+    cached = _signed_urls.get(path)
+    if cached:
+        return cached
+
+    pending = _signing.get(path)
+    if pending is None:
+        pending = asyncio.ensure_future(_create_signed_url(path))
+        _signing[path] = pending
+        pending.add_done_callback(lambda _: _signing.pop(path, None))
+
+    # Shield so one cancelled caller doesn't cancel the shared request
+    return await asyncio.shield(pending)
+
+
+def public_url(path: str) -> str:
+    """
+    Get the public URL of a receipt image.
+
+    Only usable while the 'receipts' bucket is public. The path's random
+    suffix keeps it as hard to guess as a signed URL, and unlike one the URL
+    is stable, so browsers and the CDN can cache the image.
+    """
+    return (
+        f"{settings.SUPABASE_URL.rstrip('/')}/storage/v1/object/public/"
+        f"receipts/{path}"
+    )
+
+
+async def get_receipt_image_url(path: str) -> str:
+    """Get a public or signed URL for a receipt image, per RECEIPT_IMAGES_PUBLIC."""
+    if settings.RECEIPT_IMAGES_PUBLIC:
+        return public_url(path)
+    return await get_signed_url(path)
+
+
+async def get_receipt_image_urls(paths: List[str]) -> Dict[str, Optional[str]]:
+    """
+    Get URLs for a page of receipt images with at most one Storage request.
+
+    When Storage signs the URLs, images it won't sign (not uploaded yet, or
+    the upload failed) map to None, as does every uncached image if signing
+    fails outright, so one bad image never fails the whole page. Public URLs
+    and URLs signed locally with SUPABASE_JWT_SECRET don't check that the
+    object exists, so for a missing image they load as a 404.
+
+    Args:
+        paths: Storage paths of the images in the 'receipts' bucket
+
+    Returns:
+        Each path mapped to its public or signed URL, or None
+    """
+    if settings.RECEIPT_IMAGES_PUBLIC:
+        return {path: public_url(path) for path in paths}
+
+    urls: Dict[str, Optional[str]] = {path: _signed_urls.get(path) for path in paths}
+    unsigned = [path for path, url in urls.items() if url is None]
+    if not unsigned:
+        return urls
+
+    if _SIGN_KEY:
+        for path in unsigned:
+            urls[path] = _signed_urls[path] = _sign_url(path, EXPIRES_IN)
+        return urls
+
+    try:
+        results = await _with_retry(
+            lambda: get_async_supabase_admin()
+            .storage.from_("receipts")
+            .create_signed_urls(unsigned, EXPIRES_IN)
+        )
+    except Exception as e:
+        logger.warning(f"Failed to sign {len(unsigned)} receipt images: {e!r}")
+        return urls
+
+    for item in results:
+        if not item.get("error") and item.get("signedURL"):
+            urls[item["path"]] = _signed_urls[item["path"]] = item["signedURL"]
+    return urls
+
+
+def new_receipt_image_path(
     current_user: User,
     household_id: str,
+    file_extension: str,
 ) -> str:
     """
-    Upload a receipt image to Supabase Storage.
+    Choose the storage path for a new receipt image.
+
+    The path is known before the upload happens, so the receipt row can be
+    created (and the request answered) while the bytes are still in flight.
 
     Args:
-        file_content: The image file content as bytes
-        file_extension: File extension (e.g., 'jpg', 'png', 'jpeg')
         current_user: The authenticated user object
         household_id: The household ID to organize the upload
+        file_extension: File extension (e.g., 'jpg', 'png', 'jpeg')
 
     Returns:
-        Storage path of the uploaded image
+        Storage path in the 'receipts' bucket
 
     Raises:
-        HTTPException: If upload fails
+        HTTPException: If the user or household is missing, or the extension
+            isn't a supported image type
     """
-    try:
-        # Resolve user_id from the authenticated user
-        user_id = getattr(current_user, "id", None) or (
-            current_user.get("id") if isinstance(current_user, dict) else None
+    # Resolve user_id from the authenticated user
+    user_id = getattr(current_user, "id", None) or (
+        current_user.get("id") if isinstance(current_user, dict) else None
+    )
+    if not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authenticated user required for upload",
         )
-        if not user_id:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Authenticated user required for upload",
-            )
 
-        if not household_id:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="household_id required for upload",
-            )
+    if not household_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="household_id required for upload",
+        )
 
-        # Generate unique filename: receipts/{household_id}/{user_id}/{timestamp}_{uuid}.{ext}
-        timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-        unique_id = str(uuid.uuid4())[:8]
-        filename = f"receipts/{household_id}/{timestamp}_{unique_id}.{file_extension}"
+    if file_extension not in CONTENT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported image extension: {file_extension}",
+        )
+
+    # Generate unique filename: receipts/{household_id}/{timestamp}_{uuid}.{ext}
+    timestamp = time.strftime("%Y%m%d_%H%M%S", time.gmtime())
+    unique_id = uuid.uuid4().hex[:8]
+    return f"receipts/{household_id}/{timestamp}_{unique_id}.{file_extension}"
+
+
+async def upload_receipt_image(
+    filename: str,
+    file_path: str,
+    file_extension: str,
+    public: bool = False,
+) -> str:
+    """
+    Upload a receipt image to Supabase Storage.
+
+    The file is streamed from disk rather than loaded into memory. No URL is
+    minted here: store the path and sign it when the image is read.
+
+    Args:
+        filename: Storage path from new_receipt_image_path
+        file_path: Local path of the image (from spool_upload_limited)
+        file_extension: File extension (e.g., 'jpg', 'png', 'jpeg')
+        public: Let browsers and the CDN cache the image for a year
+
+    Returns:
+        The storage path of the uploaded image
+
+    Raises:
+        HTTPException: If upload fails
+    """
+    try:
+        bucket = get_async_supabase_admin().storage.from_("receipts")
+
+        async def upload():
+            # Reopened per attempt: storage3 closes the file after sending it
+            with open(file_path, "rb") as file:
+                return await bucket.upload(
+                    path=filename,
+                    file=file,
+                    file_options={
+                        "content-type": CONTENT_TYPES[file_extension],
+                        "cache-control": PUBLIC_CACHE_CONTROL if public else "3600",
+                        # A retry after a lost response must not fail as a duplicate
+                        "upsert": "true",
+                    },
+                )
 
         # Upload to Supabase Storage bucket 'receipts'
-        result = await asyncio.to_thread(
-            lambda: supabase_admin.storage.from_("receipts").upload(
-                path=filename,
-                file=file_content,
-                file_options={"content-type": f"image/{file_extension}"},
-            )
-        )
+        result = await _with_retry(upload)
 
         # Check for errors - Supabase storage returns dict with 'error' key or raises exception
         if isinstance(result, dict) and result.get("error"):
@@ -69,42 +401,65 @@ async def upload_receipt_image(
                 detail=f"Failed to upload image: {result['error']}",
             )
 
-        # Get public URL - Supabase storage.create_signed_url
-        # expires in a 5 mins
-        signed_url_result = await asyncio.to_thread(
-            lambda: supabase_admin.storage.from_("receipts").create_signed_url(
-                filename, EXPIRES_IN
-            )
-        )
-
-        # Handle different response formats
-        if isinstance(signed_url_result, dict):
-            if signed_url_result.get("error"):
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Failed to get signed URL: {signed_url_result['error']}",
-                )
-
-            signed_url = signed_url_result.get("signedURL")
-
-            if signed_url:
-                return signed_url
+        return filename
 
     except HTTPException:
         raise
     except Exception as e:
+        raise _storage_http_error(e, "Storage upload error") from e
+
+
+async def warm_storage_connection() -> None:
+    """
+    Open a connection to Storage ahead of the first real request.
+
+    The cheap bucket lookup leaves a TLS session in the shared pool, so the
+    first upload doesn't pay for DNS and handshakes.
+    """
+    await get_async_supabase_admin().storage.get_bucket("receipts")
+
+
+def _image_path_or_400(image_url: str) -> str:
+    path = receipt_image_path(image_url)
+    if not path:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid image URL format",
+        )
+    return path
+
+
+async def _remove_images(paths: List[str]) -> Dict[str, bool]:
+    """Delete up to REMOVE_BATCH_SIZE images in one Storage request."""
+    result = await _with_retry(
+        lambda: get_async_supabase_admin().storage.from_("receipts").remove(paths)
+    )
+
+    if hasattr(result, "error") and result.error:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Storage upload error: {str(e)}",
+            detail=f"Failed to delete image: {result.error}",
         )
 
+    for path in paths:
+        _signed_urls.pop(path, None)
+    return dict.fromkeys(paths, True)
+
+
+# Single deletes issued close together go out as one remove() call
+_delete_batcher = AsyncBatcher(
+    _remove_images, max_batch_size=REMOVE_BATCH_SIZE, delay=0.05
+)
+
 
 async def delete_receipt_image(image_url: str) -> bool:
     """
     Delete a receipt image from Supabase Storage.
 
+    Deletes made within 50ms of each other are sent as one request.
+
     Args:
-        image_url: The public URL of the image to delete
+        image_url: The storage path or URL of the image to delete
 
     Returns:
         True if deletion was successful
@@ -113,32 +468,34 @@ async def delete_receipt_image(image_url: str) -> bool:
         HTTPException: If deletion fails
     """
     try:
-        # Extract path from URL
-        # Supabase Storage URLs are typically: {SUPABASE_URL}/storage/v1/object/public/{bucket}/{path}
-        if "/storage/v1/object/public/receipts/" not in image_url:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid image URL format",
-            )
+        return await _delete_batcher.load(_image_path_or_400(image_url))
 
-        path = image_url.split("/storage/v1/object/public/receipts/")[1]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise _storage_http_error(e, "Storage deletion error") from e
 
-        result = await asyncio.to_thread(
-            lambda: supabase_admin.storage.from_("receipts").remove([path])
-        )
 
-        if hasattr(result, "error") and result.error:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Failed to delete image: {result.error}",
-            )
+async def delete_receipt_images(image_urls: List[str]) -> bool:
+    """
+    Delete several receipt images with as few Storage requests as possible.
 
+    Args:
+        image_urls: Storage paths or URLs of the images to delete
+
+    Returns:
+        True if deletion was successful
+
+    Raises:
+        HTTPException: If any URL is invalid or deletion fails
+    """
+    try:
+        paths = [_image_path_or_400(image_url) for image_url in image_urls]
+        for start in range(0, len(paths), REMOVE_BATCH_SIZE):
+            await _remove_images(paths[start : start + REMOVE_BATCH_SIZE])
         return True
 
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Storage deletion error: {str(e)}",
-        )
+        raise _storage_http_error(e, "Storage deletion error") from e
@@ -0,0 +1,8 @@
+-- Covering index for membership checks (verify_household_access):
+--   SELECT role FROM household_members WHERE user_id = $1 AND household_id = $2
+-- INCLUDE (role) lets Postgres answer from the index alone (index-only scan).
+-- CONCURRENTLY avoids locking writes, so run this outside a transaction block.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS household_members_user_household_role_idx
+  ON public.household_members (user_id, household_id)
+  INCLUDE (role);
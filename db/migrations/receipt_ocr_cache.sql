@@ -0,0 +1,14 @@
+-- Veryfi responses keyed by a BLAKE2b-128 hash of the uploaded image bytes, so
+-- re-uploads of the same photo reuse the earlier OCR instead of calling Veryfi.
+-- Only the API (service role) reads or writes it.
+
+CREATE TABLE IF NOT EXISTS public.receipt_ocr_cache (
+  image_hash text PRIMARY KEY,
+  response jsonb NOT NULL,
+  created_at timestamptz NOT NULL DEFAULT now()
+);
+
+ALTER TABLE public.receipt_ocr_cache ENABLE ROW LEVEL SECURITY;
+
+REVOKE ALL ON public.receipt_ocr_cache FROM anon, authenticated;
+GRANT SELECT, INSERT ON public.receipt_ocr_cache TO service_role;
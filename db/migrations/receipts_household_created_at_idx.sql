@@ -0,0 +1,8 @@
+-- Keyset pagination index for list_receipts:
+--   WHERE household_id = $1 AND (created_at, id) < ($2, $3)
+--   ORDER BY created_at DESC, id DESC LIMIT $4
+-- Lets Postgres walk the household's receipts in page order and stop at LIMIT.
+-- CONCURRENTLY avoids locking writes, so run this outside a transaction block.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS receipts_household_created_at_idx
+  ON public.receipts (household_id, created_at DESC, id DESC);
@@ -0,0 +1,4 @@
+-- Uploads no longer send purchase_date; the database stamps it on insert.
+-- Safe to re-run if the column already has this default.
+
+ALTER TABLE public.receipts ALTER COLUMN purchase_date SET DEFAULT now();
@@ -0,0 +1,71 @@
+-- Stores a receipt's OCR results and creates its food items in one round trip
+-- and one transaction, so a receipt is never completed without its items (or
+-- vice versa):
+-- supabase.rpc('finalize_receipt', { p_receipt_id, p_receipt, p_items, ... })
+--
+-- p_receipt holds store_name, total_amount, ocr_confidence and ocr_status.
+-- p_items is an array of { name, category_id, price, quantity, storage_location };
+-- each item's expiry is its purchase date plus the category's default shelf
+-- life (30 days if the category has none). Household and receipt ids come from
+-- the receipt row. Returns the updated receipt.
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION public.finalize_receipt(
+  p_receipt_id uuid,
+  p_receipt jsonb,
+  p_items jsonb,
+  p_added_by uuid,
+  p_purchase_date timestamptz DEFAULT NULL
+)
+RETURNS public.receipts
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+  r public.receipts;
+  purchased timestamptz := coalesce(p_purchase_date, now());
+BEGIN
+  UPDATE public.receipts
+  SET store_name = p_receipt->>'store_name',
+      total_amount = (p_receipt->>'total_amount')::numeric,
+      ocr_confidence = (p_receipt->>'ocr_confidence')::numeric,
+      ocr_status = p_receipt->>'ocr_status',
+      updated_at = now()
+  WHERE id = p_receipt_id
+  RETURNING * INTO r;
+
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'receipt % not found', p_receipt_id;
+  END IF;
+
+  INSERT INTO public.food_items (
+    household_id, receipt_id, added_by, name, category_id, price, quantity,
+    unit, purchase_date, expiry_date, manual_expiry, is_consumed,
+    storage_location
+  )
+  SELECT r.household_id, r.id, p_added_by, i.name, i.category_id, i.price,
+         i.quantity, NULL, purchased,
+         purchased + make_interval(
+           days => coalesce(nullif(fc.default_shelf_life_days, 0), 30)
+         ),
+         false, false, i.storage_location
+  FROM jsonb_to_recordset(coalesce(p_items, '[]'::jsonb)) AS i(
+    name text,
+    category_id uuid,
+    price numeric,
+    quantity integer,
+    storage_location text
+  )
+  LEFT JOIN public.food_categories fc ON fc.id = i.category_id;
+
+  RETURN r;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.finalize_receipt(uuid, jsonb, jsonb, uuid, timestamptz)
+  FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.finalize_receipt(uuid, jsonb, jsonb, uuid, timestamptz)
+  TO service_role;
+
+COMMIT;
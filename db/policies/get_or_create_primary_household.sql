@@ -0,0 +1,55 @@
+-- Returns the user's primary (first) household row, creating a household with
+-- the user as owner when they have none. The lookup and both inserts run in one
+-- function so the API needs a single round trip:
+-- supabase.rpc('get_or_create_primary_household', { p_user_id: ..., p_email: ..., p_name: ... })
+--
+-- A per-user advisory lock serializes concurrent first logins, so two requests
+-- racing on a new account can't both create a household. (SELECT ... FOR UPDATE
+-- can't help here: there is no row to lock until the household exists.)
+-- p_name defaults to "<email>'s Household".
+
+BEGIN;
+
+DROP FUNCTION IF EXISTS public.get_or_create_primary_household(uuid, text);
+
+CREATE OR REPLACE FUNCTION public.get_or_create_primary_household(
+  p_user_id uuid,
+  p_email text,
+  p_name text DEFAULT NULL
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  h_row public.households%ROWTYPE;
+BEGIN
+  PERFORM pg_advisory_xact_lock(hashtext('primary_household:' || p_user_id::text));
+
+  SELECT h.* INTO h_row
+  FROM public.household_members hm
+  JOIN public.households h ON h.id = hm.household_id
+  WHERE hm.user_id = p_user_id
+  LIMIT 1;
+
+  IF NOT FOUND THEN
+    INSERT INTO public.households (name, created_by)
+    VALUES (COALESCE(p_name, concat(p_email, '''s Household')), p_user_id)
+    RETURNING * INTO h_row;
+
+    INSERT INTO public.household_members (household_id, user_id, role)
+    VALUES (h_row.id, p_user_id, 'owner');
+  END IF;
+
+  RETURN row_to_json(h_row)::jsonb;
+END;
+$$;
+
+-- Takes any user id, so only the backend (service role) may call it
+REVOKE EXECUTE ON FUNCTION public.get_or_create_primary_household(uuid, text, text)
+  FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.get_or_create_primary_household(uuid, text, text)
+  TO service_role;
+
+COMMIT;
@@ -0,0 +1,18 @@
+-- Household members joined with their auth email, so the members list is one
+-- query instead of a GoTrue lookup per member:
+-- supabase.table('household_members_with_email').select('*').eq('household_id', ...)
+--
+-- The view reads auth.users, so it is only exposed to the service role. The API
+-- checks household membership before querying it.
+
+BEGIN;
+
+CREATE OR REPLACE VIEW public.household_members_with_email AS
+SELECT hm.*, u.email
+FROM public.household_members hm
+JOIN auth.users u ON u.id = hm.user_id;
+
+REVOKE ALL ON public.household_members_with_email FROM anon, authenticated;
+GRANT SELECT ON public.household_members_with_email TO service_role;
+
+COMMIT;
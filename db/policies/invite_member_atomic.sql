@@ -0,0 +1,55 @@
+-- Adds a user to a household by email in one round trip. The auth.users lookup,
+-- the "already a member" check and the insert run in a single transaction:
+-- supabase.rpc('invite_member_atomic', { p_household_id: ..., p_email: ..., p_role: ... })
+--
+-- Returns jsonb with a "status" of 'not_found', 'already_member' or 'added';
+-- 'added' also carries the new household_members row as "member".
+-- The caller's admin role is checked by the API, so only service_role may call it.
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION public.invite_member_atomic(
+  p_household_id uuid,
+  p_email text,
+  p_role text
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public, auth
+AS $$
+DECLARE
+  uid uuid;
+  member public.household_members;
+BEGIN
+  SELECT id INTO uid
+  FROM auth.users
+  WHERE lower(email) = lower(p_email)
+  LIMIT 1;
+
+  IF NOT FOUND THEN
+    RETURN jsonb_build_object('status', 'not_found');
+  END IF;
+
+  INSERT INTO public.household_members (household_id, user_id, role)
+  SELECT p_household_id, uid, p_role
+  WHERE NOT EXISTS (
+    SELECT 1 FROM public.household_members
+    WHERE household_id = p_household_id AND user_id = uid
+  )
+  RETURNING * INTO member;
+
+  IF NOT FOUND THEN
+    RETURN jsonb_build_object('status', 'already_member', 'user_id', uid);
+  END IF;
+
+  RETURN jsonb_build_object('status', 'added', 'member', to_jsonb(member));
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.invite_member_atomic(uuid, text, text)
+  FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.invite_member_atomic(uuid, text, text)
+  TO service_role;
+
+COMMIT;
@@ -0,0 +1,16 @@
+-- Receipts are visible to members of the owning household. The API fetches
+-- receipts with the caller's JWT and relies on this policy as the access check,
+-- so a receipt outside the caller's households simply returns no row.
+-- Requires public.is_household_member from fix_rls.sql.
+
+BEGIN;
+
+ALTER TABLE public.receipts ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS receipts_select_if_member ON public.receipts;
+CREATE POLICY receipts_select_if_member ON public.receipts
+  FOR SELECT
+  TO authenticated
+  USING (public.is_household_member(household_id, auth.uid()));
+
+COMMIT;
@@ -0,0 +1,49 @@
+-- Removes a household member in one round trip. The caller (auth.uid()) may
+-- remove themselves, or anyone if they are an admin or owner of the household:
+-- supabase.rpc('remove_member', { p_household_id: ..., p_user_id: ... })
+--
+-- Returns jsonb with a "status" of 'forbidden', 'not_found' or 'removed'.
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION public.remove_member(
+  p_household_id uuid,
+  p_user_id uuid
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  caller uuid := auth.uid();
+  removed integer;
+BEGIN
+  IF caller IS NULL OR NOT (
+    caller = p_user_id
+    OR EXISTS (
+      SELECT 1 FROM public.household_members
+      WHERE household_id = p_household_id
+        AND user_id = caller
+        AND role IN ('admin', 'owner')
+    )
+  ) THEN
+    RETURN jsonb_build_object('status', 'forbidden');
+  END IF;
+
+  DELETE FROM public.household_members
+  WHERE household_id = p_household_id AND user_id = p_user_id;
+  GET DIAGNOSTICS removed = ROW_COUNT;
+
+  IF removed = 0 THEN
+    RETURN jsonb_build_object('status', 'not_found');
+  END IF;
+
+  RETURN jsonb_build_object('status', 'removed');
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.remove_member(uuid, uuid) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.remove_member(uuid, uuid) TO authenticated;
+
+COMMIT;
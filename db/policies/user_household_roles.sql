@@ -0,0 +1,17 @@
+-- Each household a user belongs to, flattened with their role, so the API can
+-- return List[HouseholdWithRole] rows as-is:
+-- supabase.table('user_household_roles').select('*').in_('user_id', [...])
+--
+-- Queried with the service role for the already-authenticated user ids.
+
+BEGIN;
+
+CREATE OR REPLACE VIEW public.user_household_roles AS
+SELECT h.*, hm.user_id, hm.role
+FROM public.households h
+JOIN public.household_members hm ON hm.household_id = h.id;
+
+REVOKE ALL ON public.user_household_roles FROM anon, authenticated;
+GRANT SELECT ON public.user_household_roles TO service_role;
+
+COMMIT;